@@ -1,12 +1,19 @@
 import random
 
+from .instrumentation import metrics
+
 class DiffieHellman:
     def __init__(self, p, g):
         self.p = p
         self.g = g
+        started = metrics.start()
         self.secret = random.randint(2, p - 2)
         self.public = pow(g, self.secret, p)
+        metrics.stop('dh_keygen', started)
 
     def compute_shared_key(self, other_public):
-        return pow(other_public, self.secret, self.p)
+        started = metrics.start()
+        shared = pow(other_public, self.secret, self.p)
+        metrics.stop('dh_shared_key', started)
+        return shared
 
@@ -0,0 +1,51 @@
+# Minimal stage timers for Diffie-Hellman.
+# The projects in this repository run standalone from their own
+# directories and share no package, so this is a trimmed copy of
+# Twofish/utils/instrumentation.py with only the parts Diffie-Hellman
+# uses. Keep the method names compatible with that module.
+import threading
+import time
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self._hooks = []
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def add_hook(self, hook):
+        # hook(stage, seconds, nbytes) is called after every recorded stage
+        self._hooks.append(hook)
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def stop(self, stage, started, nbytes=0):
+        if not started:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            stats['bytes'] += nbytes
+        for hook in self._hooks:
+            hook(stage, elapsed, nbytes)
+
+    def report(self):
+        lines = []
+        with self._lock:
+            for name, stats in sorted(self.stages.items()):
+                line = (f"{name:<20} calls {stats['calls']:>7}, "
+                        f"total {stats['seconds'] * 1000:10.2f} ms")
+                if stats['bytes'] and stats['seconds']:
+                    line += f", {stats['bytes'] / stats['seconds'] / 1e6:8.2f} MB/s"
+                lines.append(line)
+        return '\n'.join(lines)
+
+
+metrics = Instrumentation()
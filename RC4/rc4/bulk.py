@@ -0,0 +1,181 @@
+"""Concurrent RC4 processing of many files
+
+Usage: python -m rc4.bulk --key secret_key data/ [more files or dirs]
+                          [--output-dir out/] [--suffix .rc4] [--jobs 4]
+
+Each file is an independent RC4 stream with the same key. Files run in a
+process pool, at most `concurrency` at a time.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from .rc4_algorithm import RC4
+from .file_encryptor import CHUNK_SIZE
+
+DEFAULT_SUFFIX = '.rc4'
+
+
+def _process_file(input_file, output_file, key, chunk_size):
+    # Runs in a pool process: the whole file is one sequential RC4 stream
+    rc4 = RC4(key)
+    started = time.perf_counter()
+    size = 0
+    with open(input_file, 'rb') as fin, open(output_file, 'wb') as fout:
+        while True:
+            chunk = fin.read(chunk_size)
+            if not chunk:
+                break
+            fout.write(rc4.process(chunk))
+            size += len(chunk)
+    return size, time.perf_counter() - started
+
+
+def collect_files(paths, skip_suffix=None):
+    # Files given directly plus every file under the given directories,
+    # as (path, base directory) pairs; base is used to mirror the layout.
+    # Directory entries ending with skip_suffix (results of an earlier run
+    # written next to their inputs) are left out
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend((os.path.join(root, name), path) for name in sorted(names)
+                             if not (skip_suffix and name.endswith(skip_suffix)))
+        elif os.path.isfile(path):
+            files.append((path, os.path.dirname(path)))
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+    return files
+
+
+def output_path(input_file, base, output_dir=None, suffix=DEFAULT_SUFFIX):
+    if output_dir is None:
+        return input_file + suffix
+    return os.path.join(output_dir, os.path.relpath(input_file, base or '.') + suffix)
+
+
+def _check_outputs(jobs):
+    # Two jobs writing one file, or a job overwriting another job's input,
+    # would race in the pool, so such job lists are refused up front
+    inputs = {os.path.abspath(input_file) for input_file, _ in jobs}
+    outputs = set()
+    for _, output_file in jobs:
+        path = os.path.abspath(output_file)
+        if path in outputs or path in inputs:
+            raise ValueError(f"Output {output_file} collides with another job's input or output")
+        outputs.add(path)
+
+
+async def process_files(jobs, key: bytes, concurrency=None, chunk_size=CHUNK_SIZE,
+                        executor=None, progress=None):
+    """RC4-process (input, output) pairs concurrently
+
+    At most `concurrency` files (default: CPU count) are in flight; the
+    keystream work runs in `executor` (a new process pool if None).
+    Raises ValueError if two jobs share an output path or an output is
+    another job's input.
+    progress(status) is called as each file finishes. Returns per-file
+    status dicts in input order and an aggregate total.
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"Chunk size must be positive, got {chunk_size}")
+    jobs = list(jobs)
+    _check_outputs(jobs)
+    concurrency = concurrency or os.cpu_count() or 1
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=concurrency)
+
+    async def run(input_file, output_file):
+        async with semaphore:
+            status = {'input': input_file, 'output': output_file,
+                      'bytes': 0, 'seconds': 0.0, 'error': None}
+            try:
+                output_dir = os.path.dirname(output_file)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                status['bytes'], status['seconds'] = await loop.run_in_executor(
+                    executor, _process_file, input_file, output_file, key, chunk_size)
+            except Exception as e:
+                status['error'] = f"{type(e).__name__}: {e}"
+            if progress is not None:
+                progress(status)
+            return status
+
+    started = time.perf_counter()
+    try:
+        files = await asyncio.gather(*(run(i, o) for i, o in jobs))
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+
+    total = sum(f['bytes'] for f in files if f['error'] is None)
+    return {
+        'files': files,
+        'total': {
+            'files': len(files),
+            'failed': sum(1 for f in files if f['error'] is not None),
+            'bytes': total,
+            'seconds': elapsed,
+            'mb_s': total / elapsed / 1e6 if elapsed else 0.0,
+        }
+    }
+
+
+def _print_status(status):
+    if status['error'] is not None:
+        print(f"FAILED {status['input']}: {status['error']}")
+    else:
+        print(f"{status['input']} -> {status['output']}: {status['bytes']} bytes, "
+              f"{status['seconds']:.3f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RC4-process many files concurrently')
+    parser.add_argument('paths', nargs='+', help='Files and/or directories to process')
+    key = parser.add_mutually_exclusive_group(required=True)
+    key.add_argument('--key', help='Key as a UTF-8 string')
+    key.add_argument('--key-hex', help='Key as hex')
+    parser.add_argument('--output-dir', help='Directory for results (default: next to inputs)')
+    parser.add_argument('--suffix', default=DEFAULT_SUFFIX, help='Suffix for output files')
+    parser.add_argument('--jobs', type=int, help='Files processed at once (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Read size in bytes')
+    parser.add_argument('--json', dest='json_file', help='Write the report as JSON')
+    parser.add_argument('--quiet', action='store_true', help='Do not print per-file results')
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0:
+        parser.error(f"--chunk-size must be positive, got {args.chunk_size}")
+    key = bytes.fromhex(args.key_hex) if args.key_hex else args.key.encode('utf-8')
+    try:
+        jobs = [(path, output_path(path, base, args.output_dir, args.suffix))
+                for path, base in collect_files(
+                    args.paths, None if args.output_dir else args.suffix)]
+        _check_outputs(jobs)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    report = asyncio.run(process_files(jobs, key, args.jobs, args.chunk_size,
+                                       progress=None if args.quiet else _print_status))
+    total = report['total']
+    print(f"\nFiles: {total['files']}, failed: {total['failed']}, "
+          f"{total['bytes']} bytes in {total['seconds']:.3f} s ({total['mb_s']:.2f} MB/s)")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 1 if total['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
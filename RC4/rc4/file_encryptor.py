@@ -1,16 +1,68 @@
 import asyncio
 from .rc4_algorithm import RC4
+from .instrumentation import metrics
 
-CHUNK_SIZE = 4096
+CHUNK_SIZE = 64 * 1024
+# Chunks buffered between stages: 2 gives double buffering, so the reader
+# fills the next chunk while the current one is encrypted and written
+QUEUE_DEPTH = 2
 
-async def encrypt_or_decrypt_file(input_file, output_file, key: bytes):
-    rc4 = RC4(key)
+async def _read_stage(fin, chunk_size, queue, executor):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = metrics.start()
+        chunk = await loop.run_in_executor(executor, fin.read, chunk_size)
+        metrics.stop('io_read', started, len(chunk))
+        if not chunk:
+            break
+        await queue.put(chunk)
+    await queue.put(None)
+
+async def _cipher_stage(rc4, source, sink, executor):
+    # A single stage keeps chunks in order, as the RC4 stream requires
     loop = asyncio.get_running_loop()
+    while True:
+        chunk = await source.get()
+        if chunk is None:
+            break
+        await sink.put(await loop.run_in_executor(executor, rc4.process, chunk))
+    await sink.put(None)
+
+async def _write_stage(fout, queue, executor):
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await queue.get()
+        if chunk is None:
+            break
+        started = metrics.start()
+        await loop.run_in_executor(executor, fout.write, chunk)
+        metrics.stop('io_write', started, len(chunk))
+
+async def encrypt_or_decrypt_file(input_file, output_file, key: bytes,
+                                  chunk_size=CHUNK_SIZE, queue_depth=QUEUE_DEPTH,
+                                  executor=None):
+    # Reading, RC4 and writing run as separate tasks joined by bounded
+    # queues; blocking work goes to executor (the loop's default if None)
+    if chunk_size <= 0:
+        raise ValueError(f"Chunk size must be positive, got {chunk_size}")
+    # asyncio.Queue(0) would be unbounded and drop the backpressure
+    if queue_depth <= 0:
+        raise ValueError(f"Queue depth must be positive, got {queue_depth}")
+    rc4 = RC4(key)
+    read_queue = asyncio.Queue(queue_depth)
+    write_queue = asyncio.Queue(queue_depth)
 
     with open(input_file, "rb") as fin, open(output_file, "wb") as fout:
-        while True:
-            chunk = await loop.run_in_executor(None, fin.read, CHUNK_SIZE)
-            if not chunk:
-                break
-            result = rc4.process(chunk)
-            await loop.run_in_executor(None, fout.write, result)
+        tasks = [
+            asyncio.create_task(_read_stage(fin, chunk_size, read_queue, executor)),
+            asyncio.create_task(_cipher_stage(rc4, read_queue, write_queue, executor)),
+            asyncio.create_task(_write_stage(fout, write_queue, executor)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others blocked on a full queue
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
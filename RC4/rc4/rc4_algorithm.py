@@ -1,23 +1,64 @@
+from itertools import cycle
+
+from .instrumentation import metrics
+from .xor import xor_into
+
+
 class RC4:
+    # Stateful stream: S, i and j carry over between process() calls, so
+    # processing data in chunks gives the same output as a single call
     def __init__(self, key: bytes):
+        started = metrics.start()
         self.S = list(range(256))
         self.key = key
+        self.i = self.j = 0
         self._initialize_state()
+        metrics.stop('rc4_key_setup', started)
 
     def _initialize_state(self):
+        S = self.S
+        key = self.key
+        key_len = len(key)
         j = 0
         for i in range(256):
-            j = (j + self.S[i] + self.key[i % len(self.key)]) % 256
-            self.S[i], self.S[j] = self.S[j], self.S[i]
+            j = (j + S[i] + key[i % key_len]) & 0xFF
+            S[i], S[j] = S[j], S[i]
+
+    def keystream_into(self, out, n=None):
+        # Write the next n keystream bytes (default len(out)) into the
+        # preallocated buffer out. The index i just walks 1, 2, ..., 255,
+        # 0, ...; iterating over a precomputed order keeps the loop body to
+        # the swap and the lookup
+        if n is None:
+            n = len(out)
+        S = self.S
+        j = self.j
+        order = list(range(self.i + 1, 256)) + list(range(self.i + 1))
+        for k, i in zip(range(n), cycle(order)):
+            si = S[i]
+            j = (j + si) & 0xFF
+            sj = S[j]
+            S[i] = sj
+            S[j] = si
+            out[k] = S[(si + sj) & 0xFF]
+        self.i = (self.i + n) & 0xFF
+        self.j = j
+
+    def keystream(self, n: int) -> bytearray:
+        out = bytearray(n)
+        self.keystream_into(out)
+        return out
 
-    def _keystream(self):
-        i = j = 0
-        while True:
-            i = (i + 1) % 256
-            j = (j + self.S[i]) % 256
-            self.S[i], self.S[j] = self.S[j], self.S[i]
-            yield self.S[(self.S[i] + self.S[j]) % 256]
+    def skip(self, n: int):
+        # Advance the stream by n bytes without using the output (drop-N)
+        self.keystream(n)
 
     def process(self, data: bytes) -> bytes:
-        stream = self._keystream()
-        return bytes(b ^ next(stream) for b in data)
+        started = metrics.start()
+        # The keystream buffer doubles as the output: data is XORed into it
+        result = self.keystream(len(data))
+        xor_into(result, data)
+        result = bytes(result)
+        metrics.stop('rc4_process', started, len(data))
+        metrics.count('rc4_bytes', len(data))
+        return result
@@ -0,0 +1,113 @@
+from .instrumentation import metrics
+from .rc4_algorithm import RC4
+from .xor import np, xor_bytes
+
+
+class RC4Batch:
+    # N independent RC4 streams advanced in lockstep. With NumPy the KSA
+    # and the keystream run as N x 256 array operations, so the Python
+    # loop count depends on 256 and the record length, not on N. Without
+    # NumPy it falls back to one RC4 instance per key.
+    def __init__(self, keys):
+        keys = [bytes(key) for key in keys]
+        if any(not key for key in keys):
+            raise ValueError("RC4 keys must not be empty")
+        self.keys = keys
+        started = metrics.start()
+        if np is None:
+            self._streams = [RC4(key) for key in keys]
+        else:
+            self._initialize_state()
+        metrics.stop('rc4_batch_key_setup', started)
+        metrics.count('rc4_batch_keys', len(keys))
+
+    @classmethod
+    def from_record_ids(cls, base_key: bytes, record_ids, id_size=8):
+        # Per-record keys: base key followed by the record id (bytes as is,
+        # integers big-endian in id_size bytes)
+        return cls(base_key + (rid if isinstance(rid, (bytes, bytearray))
+                               else rid.to_bytes(id_size, 'big'))
+                   for rid in record_ids)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _initialize_state(self):
+        # State is stored transposed, S[x, r] for stream r, so that S[i]
+        # is contiguous and swaps are single gathers/scatters on S.ravel()
+        # at j * N + r
+        n = len(self.keys)
+        max_len = max(map(len, self.keys), default=1)
+        padded = np.frombuffer(b''.join(key.ljust(max_len, b'\0') for key in self.keys),
+                               dtype=np.uint8).reshape(n, max_len)
+        lengths = np.array([len(key) for key in self.keys], dtype=np.intp)
+        # K[x, r] = key_r[x % len(key_r)]
+        K = padded[np.arange(n)[None, :], np.arange(256)[:, None] % lengths[None, :]]
+
+        self._columns = np.arange(n, dtype=np.intp)
+        self.S = np.repeat(np.arange(256, dtype=np.uint8), n).reshape(256, n)
+        self.i = 0
+        self.j = np.zeros(n, dtype=np.intp)
+
+        S = self.S
+        flat = S.ravel()
+        columns = self._columns
+        j = np.zeros(n, dtype=np.intp)
+        for i in range(256):
+            si = S[i].copy()
+            j += si
+            j += K[i]
+            j &= 0xFF
+            index = j * n
+            index += columns
+            S[i] = flat[index]
+            flat[index] = si
+
+    def keystream(self, n: int):
+        # Next n keystream bytes of every stream: an N x n uint8 array with
+        # NumPy, a list of bytes without it
+        if np is None:
+            return [stream.keystream(n) for stream in self._streams]
+        count = len(self.keys)
+        S = self.S
+        flat = S.ravel()
+        columns = self._columns
+        i = self.i
+        j = self.j
+        out = np.empty((n, count), dtype=np.uint8)
+        for k in range(n):
+            i = (i + 1) & 0xFF
+            si = S[i].copy()
+            j += si
+            j &= 0xFF
+            index = j * count
+            index += columns
+            sj = flat[index]
+            S[i] = sj
+            flat[index] = si
+            # uint8 addition wraps, i.e. is already taken mod 256
+            sj += si
+            index = sj.astype(np.intp)
+            index *= count
+            index += columns
+            out[k] = flat[index]
+        self.i = i
+        return out.T
+
+    def process(self, records):
+        # XOR record r with the keystream of stream r; records may differ
+        # in length, every stream advances by the longest one
+        if len(records) != len(self.keys):
+            raise ValueError(f"Expected {len(self.keys)} records, got {len(records)}")
+        started = metrics.start()
+        if np is None:
+            keystream = self.keystream(max(map(len, records), default=0))
+            result = [xor_bytes(record, stream) for record, stream in zip(records, keystream)]
+        else:
+            keystream = self.keystream(max(map(len, records), default=0))
+            result = [(np.frombuffer(record, dtype=np.uint8) ^ keystream[r, :len(record)]).tobytes()
+                      for r, record in enumerate(records)]
+        total = sum(map(len, records))
+        metrics.stop('rc4_batch_process', started, total)
+        metrics.count('rc4_bytes', total)
+        return result
@@ -0,0 +1,32 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Below this size the wide-integer path is faster than building NumPy arrays
+NP_MIN_BYTES = 512
+
+
+def xor_bytes(a, b) -> bytes:
+    # a XOR b over len(a) bytes; b must be at least as long as a
+    n = len(a)
+    if not n:
+        return b''
+    if np is not None and n >= NP_MIN_BYTES:
+        return np.bitwise_xor(np.frombuffer(a, dtype=np.uint8, count=n),
+                              np.frombuffer(b, dtype=np.uint8, count=n)).tobytes()
+    x = int.from_bytes(a, 'little') ^ int.from_bytes(b[:n], 'little')
+    return x.to_bytes(n, 'little')
+
+
+def xor_into(dst, src):
+    # XOR src into the start of a writable buffer dst (bytearray, memoryview)
+    n = len(src)
+    if not n:
+        return
+    if np is not None and n >= NP_MIN_BYTES:
+        target = np.frombuffer(dst, dtype=np.uint8, count=n)
+        np.bitwise_xor(target, np.frombuffer(src, dtype=np.uint8, count=n), out=target)
+        return
+    x = int.from_bytes(dst[:n], 'little') ^ int.from_bytes(src, 'little')
+    dst[:n] = x.to_bytes(n, 'little')
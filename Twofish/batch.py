@@ -0,0 +1,311 @@
+﻿"""Пакетное шифрование множества файлов в одном процессе
+
+Запуск: python -m batch [input.txt] --source data/ [--output-dir out/]
+        python -m batch [input.txt] --source "data/**/*.txt"
+        python -m batch [input.txt] --manifest files.txt
+
+Ключ, режим, набивка и операция берутся из файла конфигурации, как у
+main.py; input/output в нем не нужны. Расписание ключа строится один раз,
+файлы раздаются пулу потоков или процессов (backend) от больших к малым.
+
+Шифрование нескольких файлов режимом с IV требует format=container: один
+IV на все файлы означал бы повторное использование гаммы (CTR, OFB, CFB)
+или раскрывал бы общие префиксы (CBC, PCBC), поэтому каждый файл получает
+собственный случайный IV, записанный в заголовок контейнера.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from core.key_cache import get_cipher
+from main import TwofishCipher, read_config_from_file
+from utils.container import SegmentedContainer
+from utils.file_handler import FileHandler
+from utils.instrumentation import metrics
+from utils.sizes import parse_size
+
+
+DEFAULT_MEMORY_BUDGET = '256M'
+
+
+class BatchJob(NamedTuple):
+    input: str
+    output: str
+    size: int
+
+
+class JobResult(NamedTuple):
+    input: str
+    output: str
+    size: int
+    written: int
+    seconds: float
+    error: Optional[str]
+
+
+# Обработчик в процессе пула (создается один раз при старте процесса)
+_worker = None
+
+
+def _init_worker(config: Dict[str, Any], cipher):
+    global _worker
+    metrics.set_verbose(False)
+    _worker = TwofishCipher(config, cipher)
+
+
+def _run_job(job: BatchJob) -> JobResult:
+    return _execute(_worker, job)
+
+
+def _execute(cipher: TwofishCipher, job: BatchJob) -> JobResult:
+    config = cipher.config
+    iv = bytes.fromhex(config['iv']) if config.get('iv') else None
+    started = time.perf_counter()
+    error = None
+    try:
+        if config['operation'] == 'encrypt':
+            cipher.encrypt_file(job.input, job.output, iv)
+        elif config['operation'] == 'decrypt':
+            cipher.decrypt_file(job.input, job.output, iv)
+        else:
+            raise ValueError(f"Неизвестная операция '{config['operation']}'")
+        written = os.path.getsize(job.output)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        written = 0
+    return JobResult(job.input, job.output, job.size, written,
+                     time.perf_counter() - started, error)
+
+
+def collect_files(source: str, skip_suffix: Optional[str] = None) -> Tuple[List[str], str]:
+    #Файлы каталога (рекурсивно) или по шаблону glob и общий базовый каталог;
+    #файлы с окончанием skip_suffix (результаты прошлого запуска рядом с
+    #входными) пропускаются
+    skipped = lambda path: bool(skip_suffix) and path.endswith(skip_suffix)
+    if os.path.isdir(source):
+        files = [os.path.join(root, name)
+                 for root, _, names in os.walk(source) for name in names
+                 if not skipped(name)]
+        base = source
+    else:
+        files = [path for path in glob.glob(source, recursive=True)
+                 if os.path.isfile(path) and not skipped(path)]
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files]) if files else ''
+    if not files:
+        raise ValueError(f"Не найдено ни одного файла: {source}")
+    return sorted(files), base
+
+
+def read_manifest(filename: str) -> List[Tuple[str, Optional[str]]]:
+    #Строки манифеста: "вход" или "вход;выход", # - комментарий
+    entries = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if ';' in line:
+                input_file, output_file = (part.strip() for part in line.split(';', 1))
+                entries.append((input_file, output_file or None))
+            else:
+                entries.append((line, None))
+    if not entries:
+        raise ValueError(f"Манифест пуст: {filename}")
+    return entries
+
+
+class BatchRunner:
+    
+    def __init__(self, config: Dict[str, Any], workers: Optional[int] = None,
+                 memory_budget: int = parse_size(DEFAULT_MEMORY_BUDGET)):
+        
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget
+        self.use_processes = config.get('backend', 'thread') == 'process'
+        # Расписание ключа строится один раз; процессам пула оно передается
+        # при старте, а внутри каждого файла параллельность не нужна
+        self.cipher = get_cipher(bytes.fromhex(config['key']), config.get('polynomial', 0x11B),
+                                 config.get('cipher_backend', 'auto'))
+        self.worker_config = dict(config, backend='thread', threads=1)
+        self.suffix = '.enc' if config['operation'] == 'encrypt' else '.dec'
+        mode_class = TwofishCipher.MODES.get(config['mode'].lower())
+        if mode_class is None:
+            raise ValueError(f"Неподдерживаемый режим: {config['mode']}")
+        self.uses_iv = SegmentedContainer.iv_length(mode_class) > 0
+    
+    def _per_file_iv(self, jobs_count: int) -> bool:
+        #Нужен ли каждому файлу свой IV (несколько файлов шифруются режимом с IV)
+        if self.config['operation'] != 'encrypt' or not self.uses_iv or jobs_count < 2:
+            return False
+        if self.config.get('format', 'raw') != 'container':
+            raise ValueError("Шифрование нескольких файлов одним IV недопустимо "
+                             "(повтор гаммы или общие префиксы): используйте format=container, "
+                             "в нем каждый файл получает свой случайный IV")
+        return True
+    
+    def plan(self, entries: List[Tuple[str, Optional[str]]], base: str = '',
+             output_dir: Optional[str] = None) -> List[BatchJob]:
+        """Список заданий, упорядоченный от больших файлов к малым
+        
+        С output_dir структура каталогов повторяется относительно base (по
+        умолчанию - общий каталог входных файлов), результаты не выходят
+        за пределы output_dir.
+        """
+        if output_dir and not base:
+            base = os.path.commonpath([os.path.dirname(os.path.abspath(input_file))
+                                       for input_file, output_file in entries
+                                       if output_file is None] or ['.'])
+        jobs = []
+        outputs = set()
+        for input_file, output_file in entries:
+            if output_file is None:
+                output_file = input_file + self.suffix
+                if output_dir:
+                    relative = os.path.relpath(os.path.abspath(input_file), os.path.abspath(base))
+                    if os.path.isabs(relative) or relative.split(os.sep)[0] == os.pardir:
+                        raise ValueError(f"Файл {input_file} вне базового каталога {base}")
+                    output_file = os.path.join(output_dir, relative + self.suffix)
+            if os.path.abspath(output_file) in outputs:
+                raise ValueError(f"Несколько заданий пишут в один файл: {output_file}")
+            outputs.add(os.path.abspath(output_file))
+            jobs.append(BatchJob(input_file, output_file, os.path.getsize(input_file)))
+        # Недопустимое повторное использование IV отклоняется до начала работы
+        self._per_file_iv(len(jobs))
+        jobs.sort(key=lambda job: job.size, reverse=True)
+        return jobs
+    
+    def estimate_memory(self, size: int) -> int:
+        #Оценка памяти на обработку одного файла
+        if self.config.get('io', 'stream') == 'mmap':
+            # Отображения входного и выходного файлов целиком
+            return 2 * size
+        if self.config.get('format', 'raw') == 'container':
+            segment_size = self.config.get('segment_size', SegmentedContainer.DEFAULT_SEGMENT_SIZE)
+            return min(size, 2 * segment_size) * 2
+        return min(size, FileHandler.CHUNK_SIZE) * 2
+    
+    def run(self, jobs: List[BatchJob],
+            progress: Optional[Callable[[JobResult], None]] = None) -> Dict[str, Any]:
+        """Выполнение заданий, возвращает результаты по файлам и итог"""
+        for job in jobs:
+            output_dir = os.path.dirname(job.output)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+        
+        worker_config = self.worker_config
+        if self._per_file_iv(len(jobs)):
+            # IV из конфигурации не используется: контейнер создаст случайный
+            # IV для каждого файла и запишет его в заголовок
+            worker_config = dict(worker_config, iv=None)
+        
+        if self.use_processes:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(worker_config, self.cipher))
+            submit = lambda job: executor.submit(_run_job, job)
+        else:
+            # Потоки используют один обработчик - режимы не хранят состояние между вызовами
+            shared = TwofishCipher(worker_config, self.cipher)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+            submit = lambda job: executor.submit(_execute, shared, job)
+        
+        results = []
+        pending = list(jobs)
+        running = {}
+        in_use = 0
+        started = time.perf_counter()
+        try:
+            while pending or running:
+                # Берем самый большой файл, укладывающийся в бюджет памяти;
+                # если ничего не выполняется, запускаем его в любом случае
+                while pending and len(running) < self.workers:
+                    for i, job in enumerate(pending):
+                        memory = self.estimate_memory(job.size)
+                        if not running or in_use + memory <= self.memory_budget:
+                            break
+                    else:
+                        break
+                    del pending[i]
+                    running[submit(job)] = memory
+                    in_use += memory
+                
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    in_use -= running.pop(future)
+                    result = future.result()
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+        finally:
+            executor.shutdown(wait=True)
+        
+        elapsed = time.perf_counter() - started
+        total = sum(r.size for r in results if r.error is None)
+        return {
+            'files': [r._asdict() for r in results],
+            'total': {
+                'files': len(results),
+                'failed': sum(1 for r in results if r.error is not None),
+                'bytes': total,
+                'seconds': elapsed,
+                'mb_s': total / elapsed / 1e6 if elapsed else 0.0,
+            }
+        }
+
+
+def _print_result(result: JobResult):
+    if result.error is not None:
+        print(f"ОШИБКА {result.input}: {result.error}")
+    else:
+        speed = result.size / result.seconds / 1e6 if result.seconds else 0.0
+        print(f"{result.input} -> {result.output}: {result.size} байт, "
+              f"{result.seconds:.3f} с, {speed:.2f} МБ/с")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Пакетное шифрование файлов Twofish')
+    parser.add_argument('config_file', nargs='?', default='input.txt',
+                        help='Файл конфигурации (по умолчанию input.txt)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--source', help='Каталог или шаблон glob с входными файлами')
+    source.add_argument('--manifest', help='Файл со строками "вход" или "вход;выход"')
+    parser.add_argument('--output-dir', help='Каталог для результатов (по умолчанию рядом с входными)')
+    parser.add_argument('--workers', type=int, help='Число обработчиков (по умолчанию число ядер)')
+    parser.add_argument('--memory-budget', default=DEFAULT_MEMORY_BUDGET,
+                        help='Ограничение памяти на одновременно обрабатываемые файлы (например 256M)')
+    parser.add_argument('--json', dest='json_file', help='Файл для отчета в формате JSON')
+    parser.add_argument('--quiet', action='store_true', help='Не печатать результаты по файлам')
+    args = parser.parse_args(argv)
+    
+    try:
+        config = read_config_from_file(args.config_file, require_io=False)
+        runner = BatchRunner(config, args.workers, parse_size(args.memory_budget))
+        if args.manifest:
+            jobs = runner.plan(read_manifest(args.manifest), output_dir=args.output_dir)
+        else:
+            files, base = collect_files(args.source, None if args.output_dir else runner.suffix)
+            jobs = runner.plan([(f, None) for f in files], base, args.output_dir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Ошибка: {e}")
+        return 1
+    
+    report = runner.run(jobs, None if args.quiet else _print_result)
+    total = report['total']
+    print(f"\nФайлов: {total['files']}, ошибок: {total['failed']}, "
+          f"{total['bytes']} байт за {total['seconds']:.3f} с ({total['mb_s']:.2f} МБ/с)")
+    
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 1 if total['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+﻿"""Замер производительности Twofish по режимам, ключам и полиномам
+
+Запуск: python -m benchmark [--sizes 16,1K,1M,100M] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from core.backends import get_backend, probe_results
+from main import TwofishCipher
+from padding.padding_schemes import PaddingMode
+from utils.sizes import parse_size
+from config import BLOCK_SIZE, KEY_SIZES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+DEFAULT_SIZES = '16,1K,64K,1M'
+DEFAULT_POLYNOMIALS = '0x11B,0x11D,0x1F5'
+
+# Во сколько раз больше вызовов шифра на байт, чем у блочных режимов:
+# размер данных для этих режимов уменьшается во столько же раз, иначе
+# один случай CFB-1 на 1 МБ шел бы несколько минут
+SIZE_DIVISORS = {'cfb8': BLOCK_SIZE, 'cfb1': BLOCK_SIZE * 8}
+
+
+def case_size(mode_name: str, size: int, scale: bool = True) -> int:
+    #Размер данных случая с учетом стоимости режима (не меньше блока)
+    if not scale:
+        return size
+    return max(min(size, BLOCK_SIZE), size // SIZE_DIVISORS.get(mode_name, 1))
+
+def peak_rss_kb() -> Optional[int]:
+    #Пиковый размер резидентной памяти процесса в КБ - максимум за все
+    #время работы, поэтому он сообщается один раз за прогон, а не по случаям
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS значение в байтах, на Linux - в килобайтах
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _timed(func, min_time: float) -> float:
+    #Среднее время одного вызова (повторяем, пока не наберется min_time)
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+def measure_key_setup(key: bytes, polynomial: int, rounds: int = 5) -> float:
+    #Время развертывания ключа в микросекундах (без общего кэша)
+    start = time.perf_counter()
+    cls = get_backend()
+    for _ in range(rounds):
+        cls(key, polynomial)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def run_case(mode_name: str, padding: PaddingMode, key_size: int, polynomial: int,
+             size: int, min_time: float, scale: bool = True) -> Dict[str, Any]:
+    requested_size = size
+    size = case_size(mode_name, size, scale)
+    key = os.urandom(key_size)
+    mode_class = TwofishCipher.MODES[mode_name]
+    mode = mode_class(get_backend()(key, polynomial), padding)
+    iv = os.urandom(BLOCK_SIZE // 2 if mode_name == 'ctr' else BLOCK_SIZE)
+    data = os.urandom(size)
+    
+    encrypted = mode.encrypt(data, iv)
+    encrypt_time = _timed(lambda: mode.encrypt(data, iv), min_time)
+    decrypt_time = _timed(lambda: mode.decrypt(encrypted, iv), min_time)
+    
+    blocks = max(1, (size + BLOCK_SIZE - 1) // BLOCK_SIZE)
+    return {
+        'mode': mode_name,
+        'padding': padding.value,
+        'key_bits': key_size * 8,
+        'polynomial': hex(polynomial),
+        'size': size,
+        'requested_size': requested_size,
+        'encrypt_mb_s': size / encrypt_time / 1e6,
+        'decrypt_mb_s': size / decrypt_time / 1e6,
+        'encrypt_blocks_s': blocks / encrypt_time,
+        'decrypt_blocks_s': blocks / decrypt_time,
+        'key_setup_us': measure_key_setup(key, polynomial),
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'numpy': numpy_version,
+        'cpu_count': os.cpu_count(),
+        'cipher_backend': get_backend().__name__,
+        'backend_probe': probe_results(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def run_benchmarks(modes: List[str], paddings: List[PaddingMode], key_sizes: List[int],
+                   polynomials: List[int], sizes: List[int], min_time: float,
+                   verbose: bool = True, scale: bool = True) -> Dict[str, Any]:
+    results = []
+    for mode_name in modes:
+        mode_class = TwofishCipher.MODES[mode_name]
+        # Режимам без набивки достаточно одного варианта набивки
+        mode_paddings = paddings if mode_class.PADDED else paddings[:1]
+        for padding in mode_paddings:
+            for key_size in key_sizes:
+                for polynomial in polynomials:
+                    for size in sizes:
+                        result = run_case(mode_name, padding, key_size, polynomial,
+                                          size, min_time, scale)
+                        results.append(result)
+                        if verbose:
+                            print(f"{mode_name:>11} {padding.value:>9} {key_size * 8:>3} бит "
+                                  f"{hex(polynomial)} {result['size']:>10} Б: "
+                                  f"шифр. {result['encrypt_mb_s']:8.2f} МБ/с, "
+                                  f"дешифр. {result['decrypt_mb_s']:8.2f} МБ/с, "
+                                  f"ключ {result['key_setup_us']:8.0f} мкс")
+    peak = peak_rss_kb()
+    if verbose and peak is not None:
+        print(f"Пиковая память процесса за прогон: {peak} КБ")
+    return {'environment': environment_info(), 'results': results, 'peak_rss_kb': peak}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Замер производительности Twofish')
+    parser.add_argument('--modes', default=','.join(TwofishCipher.MODES),
+                        help='Режимы через запятую (по умолчанию все)')
+    parser.add_argument('--paddings', default=','.join(p.value for p in PaddingMode),
+                        help='Режимы набивки через запятую (по умолчанию все)')
+    parser.add_argument('--key-sizes', default=','.join(str(k * 8) for k in KEY_SIZES),
+                        help='Размеры ключа в битах через запятую')
+    parser.add_argument('--polynomials', default=DEFAULT_POLYNOMIALS,
+                        help='Полиномы GF(2^8) в hex через запятую')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help='Размеры данных через запятую (например 16,1K,1M,100M)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='Минимальное время замера одного случая, с')
+    parser.add_argument('--json', dest='json_file',
+                        help='Файл для результатов в формате JSON')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Не печатать результаты по ходу замера')
+    parser.add_argument('--full-size', action='store_true',
+                        help='Не уменьшать размер данных для CFB-8/CFB-1 (очень долго)')
+    args = parser.parse_args(argv)
+    
+    modes = [m.strip().lower() for m in args.modes.split(',')]
+    unknown = [m for m in modes if m not in TwofishCipher.MODES]
+    if unknown:
+        parser.error(f"Неподдерживаемые режимы: {', '.join(unknown)}")
+    
+    report = run_benchmarks(
+        modes,
+        [PaddingMode(p.strip().lower()) for p in args.paddings.split(',')],
+        [int(k) // 8 for k in args.key_sizes.split(',')],
+        [int(p, 16) for p in args.polynomials.split(',')],
+        [parse_size(s) for s in args.sizes.split(',')],
+        args.min_time,
+        verbose=not args.quiet,
+        scale=not args.full_size
+    )
+    
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Результаты записаны в {args.json_file}")
+    elif args.quiet:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
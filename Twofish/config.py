@@ -7,6 +7,9 @@ KEY_SIZES = [16, 24, 32]
 # Количество раундов
 ROUNDS = 16
 
+# Максимальное число развернутых ключевых расписаний в общем кэше
+KEY_CACHE_SIZE = 32
+
 # Все возможные неприводимые полиномы для GF(2^8)
 GF256_POLYNOMIALS = [
     0x11B,  # x^8 + x^4 + x^3 + x + 1 (используется в AES)
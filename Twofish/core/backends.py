@@ -0,0 +1,209 @@
+﻿"""Реестр реализаций Twofish и автоматический выбор самой быстрой
+
+Все реализации - подклассы Twofish с общим интерфейсом (encrypt_block,
+encrypt_blocks_into и т.д.) и дают одинаковый шифртекст:
+    reference - g-функция вычисляется по определению через _h (эталон)
+    table     - полное ключевание: g-функция из четырех ключевых таблиц
+    numpy     - таблицы + пакетная обработка блоков массивами NumPy
+
+Выбор выполняется лениво при первом обращении: каждая доступная реализация
+проверяется на известных векторах и замеряется, берется самая быстрая.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from .twofish import Twofish
+from config import ROUNDS
+from utils.numpy_loader import load_numpy
+
+
+class ReferenceTwofish(Twofish):
+    """g-функция по определению, без ключевых таблиц"""
+    
+    USE_NUMPY = False
+    
+    def _generate_key_tables(self):
+        # Таблицы не нужны - g-функция вычисляется через _h
+        self._sbox = []
+    
+    def _encrypt_words(self, x0: int, x1: int, x2: int, x3: int):
+        if self._wiped:
+            self._check_wiped()
+        k = self._round_keys
+        s = self._s
+        
+        x0 ^= k[0]
+        x1 ^= k[1]
+        x2 ^= k[2]
+        x3 ^= k[3]
+        
+        for r in range(8, 8 + 2 * ROUNDS, 2):
+            t0 = self._h(x0, s)
+            t1 = self._h(x1, s)
+            
+            x2 ^= (t0 + t1 + k[r]) & 0xFFFFFFFF
+            x2 = (x2 >> 1) | ((x2 & 1) << 31)
+            
+            x3 = ((x3 << 1) | (x3 >> 31)) & 0xFFFFFFFF
+            x3 ^= (t0 + 2*t1 + k[r + 1]) & 0xFFFFFFFF
+            
+            x0, x1, x2, x3 = x2, x3, x0, x1
+        
+        return x2 ^ k[4], x3 ^ k[5], x0 ^ k[6], x1 ^ k[7]
+    
+    def _decrypt_words(self, y0: int, y1: int, y2: int, y3: int):
+        if self._wiped:
+            self._check_wiped()
+        k = self._round_keys
+        s = self._s
+        
+        x0, x1, x2, x3 = y2 ^ k[6], y3 ^ k[7], y0 ^ k[4], y1 ^ k[5]
+        
+        for r in range(6 + 2 * ROUNDS, 6, -2):
+            x0, x1, x2, x3 = x2, x3, x0, x1
+            
+            t0 = self._h(x0, s)
+            t1 = self._h(x1, s)
+            
+            x3 ^= (t0 + 2*t1 + k[r + 1]) & 0xFFFFFFFF
+            x3 = (x3 >> 1) | ((x3 & 1) << 31)
+            
+            x2 = ((x2 << 1) | (x2 >> 31)) & 0xFFFFFFFF
+            x2 ^= (t0 + t1 + k[r]) & 0xFFFFFFFF
+        
+        return x0 ^ k[0], x1 ^ k[1], x2 ^ k[2], x3 ^ k[3]
+
+
+class TableTwofish(Twofish):
+    """Ключевые таблицы, пакеты обрабатываются поблочно"""
+    
+    USE_NUMPY = False
+
+
+class NumpyTwofish(Twofish):
+    """Ключевые таблицы и пакетная обработка через NumPy"""
+    
+    USE_NUMPY = True
+
+
+# Известные векторы этой реализации: (ключ, полином, открытый текст, шифртекст)
+KNOWN_ANSWERS = [
+    (bytes(range(16)), 0x11B, bytes(range(16)), bytes.fromhex('9e4449725a809667e75ab45e3a0063ce')),
+    (bytes(range(32)), 0x11D, bytes(16), bytes.fromhex('4c6117d6cc61c4ce09f1ed7e88b735eb')),
+]
+
+# Пакет для проверки пакетных методов и замера (больше порога NumPy);
+# реализациям без NumPy размер пакета не важен - им хватает нескольких блоков
+PROBE_BLOCKS = 64
+PROBE_BLOCKS_SERIAL = 4
+# Время замера одной реализации, с
+PROBE_TIME = 0.01
+
+_registry: Dict[str, tuple] = {}
+_selected: Optional[str] = None
+_probe_results: Dict[str, Optional[float]] = {}
+_lock = threading.Lock()
+
+
+def register_backend(name: str, cls: type, available: Callable[[], bool] = lambda: True):
+    """Регистрация реализации (available - проверка наличия зависимостей)"""
+    global _selected
+    with _lock:
+        _registry[name] = (cls, available)
+        # Новая реализация может оказаться быстрее - выбор повторится
+        _selected = None
+
+
+def available_backends() -> List[str]:
+    return [name for name, (_, available) in _registry.items() if available()]
+
+
+def _probe_blocks(cls: type) -> int:
+    return PROBE_BLOCKS if cls.USE_NUMPY else PROBE_BLOCKS_SERIAL
+
+
+def _check_known_answers(cls: type) -> bool:
+    #Проверка реализации на известных векторах (блок, пакет, дешифрование)
+    count = _probe_blocks(cls)
+    for key, polynomial, plain, expected in KNOWN_ANSWERS:
+        cipher = cls(key, polynomial)
+        if cipher.encrypt_block(plain) != expected or cipher.decrypt_block(expected) != plain:
+            return False
+        batch = plain * count
+        encrypted = cipher.encrypt_blocks(batch)
+        if encrypted != expected * count or cipher.decrypt_blocks(encrypted) != batch:
+            return False
+    return True
+
+
+def _measure(cls: type) -> float:
+    #Скорость пакетного шифрования, блоков в секунду
+    key, polynomial, plain, _ = KNOWN_ANSWERS[0]
+    cipher = cls(key, polynomial)
+    count = _probe_blocks(cls)
+    data = plain * count
+    out = bytearray(len(data))
+    blocks = 0
+    start = time.perf_counter()
+    while True:
+        cipher.encrypt_blocks_into(data, out)
+        blocks += count
+        elapsed = time.perf_counter() - start
+        if elapsed >= PROBE_TIME:
+            return blocks / elapsed
+
+
+def probe_backends() -> Dict[str, Optional[float]]:
+    """Проверка и замер всех доступных реализаций
+    
+    Возвращает скорость (блоков в секунду) по имени реализации; None -
+    реализация не прошла проверку на известных векторах.
+    """
+    results = {}
+    for name in available_backends():
+        cls = _registry[name][0]
+        try:
+            results[name] = _measure(cls) if _check_known_answers(cls) else None
+        except Exception:
+            results[name] = None
+    return results
+
+
+def select_backend() -> str:
+    """Имя самой быстрой исправной реализации (замер выполняется один раз)"""
+    global _selected, _probe_results
+    with _lock:
+        if _selected is not None:
+            return _selected
+    results = probe_backends()
+    working = {name: speed for name, speed in results.items() if speed is not None}
+    if not working:
+        raise RuntimeError("Ни одна реализация Twofish не прошла проверку на известных векторах")
+    with _lock:
+        _probe_results = results
+        _selected = max(working, key=working.get)
+        return _selected
+
+
+def probe_results() -> Dict[str, Optional[float]]:
+    #Результаты последнего замера (пусто, если выбор еще не выполнялся)
+    return dict(_probe_results)
+
+
+def get_backend(name: Optional[str] = None) -> type:
+    """Класс реализации по имени; None или 'auto' - самая быстрая"""
+    if name is None or name == 'auto':
+        name = select_backend()
+    entry = _registry.get(name)
+    if entry is None:
+        raise ValueError(f"Неизвестная реализация Twofish: {name}")
+    cls, available = entry
+    if not available():
+        raise ValueError(f"Реализация Twofish '{name}' недоступна в этом окружении")
+    return cls
+
+
+register_backend('reference', ReferenceTwofish)
+register_backend('table', TableTwofish)
+register_backend('numpy', NumpyTwofish, lambda: load_numpy() is not None)
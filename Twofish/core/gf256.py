@@ -1,7 +1,63 @@
-﻿from typing import Optional
+﻿from typing import Optional, NamedTuple
+import threading
 from config import GF256_POLYNOMIALS
 
 
+class GF256Tables(NamedTuple):
+    """Неизменяемые таблицы поля для одного полинома"""
+    exp: bytes   # 512 элементов: степени образующего
+    log: bytes   # 256 элементов: дискретные логарифмы
+    mul: bytes   # 256×256: произведение a*b по индексу (a << 8) | b
+    inv: bytes   # 256 элементов: обратные элементы (inv[0] = 0)
+
+
+# Таблицы строятся лениво, по одному набору на полином, и разделяются
+# всеми экземплярами GF256 (и, следовательно, Twofish)
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _build_tables(polynomial: int) -> GF256Tables:
+    exp_table = [0] * 512
+    log_table = [0] * 256
+    
+    x = 1
+    for i in range(1, 256):
+        x <<= 1
+        if x & 0x100:
+            x ^= polynomial
+        exp_table[i] = x
+        log_table[x] = i
+    
+    # Заполняем exp_table для индексов > 255
+    for i in range(255, 512):
+        exp_table[i] = exp_table[i - 255]
+    
+    # Таблица умножения: строка для a = 0 и столбец для b = 0 нулевые
+    mul_table = bytearray(256 * 256)
+    for a in range(1, 256):
+        la = log_table[a]
+        mul_table[(a << 8) + 1:(a + 1) << 8] = bytes(
+            exp_table[la + log_table[b]] for b in range(1, 256))
+    
+    inv_table = bytes([0] + [exp_table[255 - log_table[a]] for a in range(1, 256)])
+    
+    return GF256Tables(bytes(exp_table), bytes(log_table), bytes(mul_table), inv_table)
+
+
+def get_tables(polynomial: int) -> GF256Tables:
+    """Общие таблицы GF(2^8) для полинома (строятся при первом обращении)"""
+    tables = _tables.get(polynomial)
+    if tables is None:
+        if polynomial not in GF256_POLYNOMIALS:
+            raise ValueError(f"Неподдерживаемый полином: {hex(polynomial)}")
+        with _tables_lock:
+            tables = _tables.get(polynomial)
+            if tables is None:
+                tables = _tables[polynomial] = _build_tables(polynomial)
+    return tables
+
+
 class GF256:
     
     def __init__(self, polynomial: int = 0x11B):
@@ -13,21 +69,25 @@ class GF256:
         self._init_tables()
     
     def _init_tables(self):
-
-        self.exp_table = [0] * 512
-        self.log_table = [0] * 256
-        
-        x = 1
-        for i in range(1, 256):
-            x <<= 1
-            if x & 0x100:
-                x ^= self.polynomial
-            self.exp_table[i] = x
-            self.log_table[x] = i
-        
-        # Заполняем exp_table для индексов > 255
-        for i in range(255, 512):
-            self.exp_table[i] = self.exp_table[i - 255]
+        #Подключение общих таблиц полинома
+        tables = get_tables(self.polynomial)
+        self.exp_table = tables.exp
+        self.log_table = tables.log
+        self.mul_table = tables.mul
+        self.inv_table = tables.inv
+    
+    def __getstate__(self):
+        # Таблицы общие для процесса - при передаче в другой процесс
+        # достаточно полинома
+        return {'polynomial': self.polynomial}
+    
+    def __setstate__(self, state):
+        self.polynomial = state['polynomial']
+        self._init_tables()
+    
+    def mul_column(self, c: int) -> bytes:
+        #Таблица умножения на константу c (256 элементов)
+        return self.mul_table[c << 8:(c + 1) << 8]
     
     def add(self, a: int, b: int) -> int:
         #Сложение (XOR)
@@ -39,9 +99,7 @@ class GF256:
     
     def mul(self, a: int, b: int) -> int:
         #Умножение 
-        if a == 0 or b == 0:
-            return 0
-        return self.exp_table[self.log_table[a] + self.log_table[b]]
+        return self.mul_table[(a << 8) | b]
     
     def div(self, a: int, b: int) -> int:
         #Деление 
@@ -63,4 +121,4 @@ class GF256:
         #Обратный элемент 
         if a == 0:
             raise ZeroDivisionError("Нулевой элемент не имеет обратного")
-        return self.exp_table[255 - self.log_table[a]]
\ No newline at end of file
+        return self.inv_table[a]
\ No newline at end of file
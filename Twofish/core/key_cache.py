@@ -0,0 +1,99 @@
+﻿"""Общий кэш развернутых ключевых расписаний Twofish"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from .twofish import Twofish
+from .backends import get_backend
+from config import KEY_CACHE_SIZE
+
+
+class KeyScheduleCache:
+    """LRU-кэш готовых экземпляров Twofish по (хэш ключа, полином, реализация)"""
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE):
+
+        if max_size < 1:
+            raise ValueError("Размер кэша должен быть положительным")
+
+        self.max_size = max_size
+        self._ciphers = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(key: bytes, polynomial: int, backend: Optional[str]) -> Tuple[bytes, int, type]:
+        # Сам ключ в словаре не храним - только его хэш
+        return hashlib.sha256(key).digest(), polynomial, get_backend(backend)
+
+    def get(self, key: bytes, polynomial: int = 0x11B, backend: Optional[str] = None) -> Twofish:
+        #Готовый шифр из кэша или новый (с вытеснением самого старого);
+        #backend - имя реализации, None - самая быстрая из доступных
+        cache_key = self._cache_key(key, polynomial, backend)
+        with self._lock:
+            cipher = self._ciphers.get(cache_key)
+            if cipher is not None:
+                self._ciphers.move_to_end(cache_key)
+                self.hits += 1
+                return cipher
+
+            self.misses += 1
+            cipher = cache_key[2](key, polynomial)
+            self._ciphers[cache_key] = cipher
+            # Вытесненные по LRU расписания не затираются: они могут
+            # еще использоваться вызывающим кодом
+            while len(self._ciphers) > self.max_size:
+                self._ciphers.popitem(last=False)
+            return cipher
+
+    def evict(self, key: bytes, polynomial: int = 0x11B, backend: Optional[str] = None) -> bool:
+        #Явное удаление расписания из кэша с затиранием ключевого материала.
+        #Экземпляр становится непригоден у всех, кто получил его из кэша
+        #(TwofishCipher, BatchRunner и т.д.): шифрование им вызывает RuntimeError
+        with self._lock:
+            cipher = self._ciphers.pop(self._cache_key(key, polynomial, backend), None)
+        if cipher is None:
+            return False
+        cipher.wipe()
+        return True
+
+    def clear(self):
+        #Удаление и затирание всех расписаний (как evict - все выданные
+        #экземпляры становятся непригодны)
+        with self._lock:
+            ciphers = list(self._ciphers.values())
+            self._ciphers.clear()
+        for cipher in ciphers:
+            cipher.wipe()
+
+    def resize(self, max_size: int):
+        #Изменение размера кэша (лишние старые записи вытесняются)
+        if max_size < 1:
+            raise ValueError("Размер кэша должен быть положительным")
+        with self._lock:
+            self.max_size = max_size
+            while len(self._ciphers) > self.max_size:
+                self._ciphers.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._ciphers)
+
+
+# Общий для процесса кэш
+_default_cache: Optional[KeyScheduleCache] = None
+_default_lock = threading.Lock()
+
+
+def get_key_cache() -> KeyScheduleCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = KeyScheduleCache()
+        return _default_cache
+
+
+def get_cipher(key: bytes, polynomial: int = 0x11B, backend: Optional[str] = None) -> Twofish:
+    """Готовый к работе экземпляр Twofish из общего кэша"""
+    return get_key_cache().get(key, polynomial, backend)
@@ -4,6 +4,8 @@ import struct
 from typing import List
 from .gf256 import GF256
 from config import BLOCK_SIZE, ROUNDS
+from utils.instrumentation import metrics
+from utils.numpy_loader import load_numpy
 
 
 class Twofish:
@@ -20,6 +22,12 @@ class Twofish:
         [0x1, 0xE, 0x2, 0xB, 0x4, 0xC, 0x3, 0x7, 0x6, 0xD, 0xA, 0x5, 0xF, 0x9, 0x0, 0x8]
     ]
     
+    # Минимальное число блоков, с которого пакетная обработка через NumPy
+    # выгоднее поблочной (накладные расходы на создание массивов)
+    NP_MIN_BLOCKS = 24
+    # Пакетные методы используют NumPy, если он установлен
+    USE_NUMPY = True
+    
     # Матрица MDS
     MDS = [
         [0x01, 0xEF, 0x5B, 0x5B],
@@ -30,6 +38,8 @@ class Twofish:
     
     def __init__(self, key: bytes, polynomial: int = 0x11B):
 
+        started = metrics.start()
+        
         if len(key) not in [16, 24, 32]:
             raise ValueError(f"Ключ должен быть 16, 24 или 32 байта, получено {len(key)}")
         
@@ -55,6 +65,39 @@ class Twofish:
         # Генерация раундовых ключей
         self._round_keys = [0] * 40
         self._generate_round_keys()
+        
+        # Ключевые таблицы g-функции (S-блок × MDS)
+        self._generate_key_tables()
+        self._np_tables = None
+        self._wiped = False
+        
+        metrics.stop('key_setup', started)
+    
+    def __getstate__(self):
+        # Развернутое расписание передается целиком (без повторной
+        # генерации ключа); массивы NumPy пересоздаются лениво
+        state = self.__dict__.copy()
+        state['_np_tables'] = None
+        return state
+    
+    def wipe(self):
+        #Затирание ключевого материала; после этого любое шифрование или
+        #дешифрование этим экземпляром завершается RuntimeError
+        for words in (self._me, self._mo, self._s, self._round_keys, *self._sbox):
+            for i in range(len(words)):
+                words[i] = 0
+        if self._np_tables is not None:
+            tables, round_keys = self._np_tables
+            for t in tables:
+                t.fill(0)
+            round_keys.fill(0)
+            self._np_tables = None
+        self.key = b''
+        self._wiped = True
+    
+    def _check_wiped(self):
+        if self._wiped:
+            raise RuntimeError("Ключевой материал затерт: экземпляр Twofish больше непригоден")
     
     def _q0(self, x: int) -> int:
         #Q0 перестановка для 4-битного входа
@@ -137,74 +180,210 @@ class Twofish:
             self._round_keys[2*i + 1] = ((a + 2*b) & 0xFFFFFFFF) << 9 | ((a + 2*b) >> 23)
             self._round_keys[2*i + 1] &= 0xFFFFFFFF
     
-    def encrypt_block(self, block: bytes) -> bytes:
-      
-        #Шифрование одного 16-байтового блока
-        if len(block) != BLOCK_SIZE:
-            raise ValueError(f"Размер блока должен быть {BLOCK_SIZE} байт")
-        
-        # Разбиваем блок на 4 32-битных слова
-        x = list(struct.unpack('<4I', block))
+    def _generate_key_tables(self):
+        #Полное ключевание: для каждого байта входа g-функции заранее
+        #вычисляем S-блок, умноженный на соответствующий столбец MDS
+        self._sbox = [[0] * 256 for _ in range(4)]
+        for j in range(4):
+            q = self._q0 if j == 0 or j == 2 else self._q1
+            key_bytes = [(k >> (8 * j)) & 0xFF for k in self._s]
+            m0, m1, m2, m3 = (self.gf.mul_column(self.MDS[i][j]) for i in range(4))
+            table = self._sbox[j]
+            for x in range(256):
+                y = q(x)
+                for k in key_bytes:
+                    y = q(y ^ k)
+                table[x] = m0[y] | (m1[y] << 8) | (m2[y] << 16) | (m3[y] << 24)
+    
+    def _encrypt_words(self, x0: int, x1: int, x2: int, x3: int):
+        #16 раундов шифрования над четырьмя 32-битными словами
+        if self._wiped:
+            self._check_wiped()
+        s0, s1, s2, s3 = self._sbox
+        k = self._round_keys
         
         # Входное отбеливание
-        for i in range(4):
-            x[i] ^= self._round_keys[i]
+        x0 ^= k[0]
+        x1 ^= k[1]
+        x2 ^= k[2]
+        x3 ^= k[3]
         
         # 16 раундов
-        for r in range(ROUNDS):
+        for r in range(8, 8 + 2 * ROUNDS, 2):
             # Вычисляем g-функции
-            t0 = self._h(x[0], self._s)
-            t1 = self._h(x[1], self._s)
+            t0 = s0[x0 & 0xFF] ^ s1[(x0 >> 8) & 0xFF] ^ s2[(x0 >> 16) & 0xFF] ^ s3[x0 >> 24]
+            t1 = s0[x1 & 0xFF] ^ s1[(x1 >> 8) & 0xFF] ^ s2[(x1 >> 16) & 0xFF] ^ s3[x1 >> 24]
             
             # PHT и добавление раундовых ключей
-            x[2] ^= (t0 + t1 + self._round_keys[2*r + 8]) & 0xFFFFFFFF
-            x[2] = (x[2] >> 1) | ((x[2] & 1) << 31)
+            x2 ^= (t0 + t1 + k[r]) & 0xFFFFFFFF
+            x2 = (x2 >> 1) | ((x2 & 1) << 31)
             
-            x[3] = ((x[3] << 1) | (x[3] >> 31)) & 0xFFFFFFFF
-            x[3] ^= (t0 + 2*t1 + self._round_keys[2*r + 9]) & 0xFFFFFFFF
+            x3 = ((x3 << 1) | (x3 >> 31)) & 0xFFFFFFFF
+            x3 ^= (t0 + 2*t1 + k[r + 1]) & 0xFFFFFFFF
             
             # Перестановка слов
-            x[0], x[1], x[2], x[3] = x[2], x[3], x[0], x[1]
+            x0, x1, x2, x3 = x2, x3, x0, x1
         
-        # Обратная перестановка
-        x[0], x[1], x[2], x[3] = x[2], x[3], x[0], x[1]
+        # Обратная перестановка и выходное отбеливание
+        return x2 ^ k[4], x3 ^ k[5], x0 ^ k[6], x1 ^ k[7]
+    
+    def _decrypt_words(self, y0: int, y1: int, y2: int, y3: int):
+        #Обратные 16 раундов над четырьмя 32-битными словами
+        if self._wiped:
+            self._check_wiped()
+        s0, s1, s2, s3 = self._sbox
+        k = self._round_keys
         
-        # Выходное отбеливание
-        for i in range(4):
-            x[i] ^= self._round_keys[i + 4]
+        # Снимаем выходное отбеливание и обратную перестановку
+        x0, x1, x2, x3 = y2 ^ k[6], y3 ^ k[7], y0 ^ k[4], y1 ^ k[5]
+        
+        # Обратные 16 раундов
+        for r in range(6 + 2 * ROUNDS, 6, -2):
+            x0, x1, x2, x3 = x2, x3, x0, x1
+            
+            t0 = s0[x0 & 0xFF] ^ s1[(x0 >> 8) & 0xFF] ^ s2[(x0 >> 16) & 0xFF] ^ s3[x0 >> 24]
+            t1 = s0[x1 & 0xFF] ^ s1[(x1 >> 8) & 0xFF] ^ s2[(x1 >> 16) & 0xFF] ^ s3[x1 >> 24]
+            
+            x3 ^= (t0 + 2*t1 + k[r + 1]) & 0xFFFFFFFF
+            x3 = (x3 >> 1) | ((x3 & 1) << 31)
+            
+            x2 = ((x2 << 1) | (x2 >> 31)) & 0xFFFFFFFF
+            x2 ^= (t0 + t1 + k[r]) & 0xFFFFFFFF
         
-        return struct.pack('<4I', *x)
+        # Входное отбеливание (для дешифрования)
+        return x0 ^ k[0], x1 ^ k[1], x2 ^ k[2], x3 ^ k[3]
     
-    def decrypt_block(self, block: bytes) -> bytes:
-        """Дешифрование одного 16-байтового блока"""
-        if len(block) != BLOCK_SIZE:
+    @staticmethod
+    def _check_block(block, offset: int):
+        if offset < 0 or len(block) - offset < BLOCK_SIZE:
             raise ValueError(f"Размер блока должен быть {BLOCK_SIZE} байт")
+    
+    def encrypt_block(self, block: bytes, offset: int = 0) -> bytes:
+      
+        #Шифрование одного 16-байтового блока (block может быть буфером,
+        #тогда блок берется со смещения offset)
+        self._check_block(block, offset)
+        return struct.pack('<4I', *self._encrypt_words(*struct.unpack_from('<4I', block, offset)))
+    
+    def decrypt_block(self, block: bytes, offset: int = 0) -> bytes:
+        """Дешифрование одного 16-байтового блока"""
+        self._check_block(block, offset)
+        return struct.pack('<4I', *self._decrypt_words(*struct.unpack_from('<4I', block, offset)))
+    
+    def encrypt_block_into(self, block, offset: int, out, out_offset: int):
+        #Шифрование блока со смещения offset с записью в out по смещению out_offset
+        self._check_block(block, offset)
+        struct.pack_into('<4I', out, out_offset,
+                         *self._encrypt_words(*struct.unpack_from('<4I', block, offset)))
+    
+    def encrypt_int(self, block: int) -> int:
+        #Шифрование блока, заданного 128-битным целым (байты блока в порядке
+        #little-endian) - без создания промежуточных объектов bytes
+        y0, y1, y2, y3 = self._encrypt_words(block & 0xFFFFFFFF, (block >> 32) & 0xFFFFFFFF,
+                                             (block >> 64) & 0xFFFFFFFF, block >> 96)
+        return y0 | (y1 << 32) | (y2 << 64) | (y3 << 96)
+    
+    def decrypt_block_into(self, block, offset: int, out, out_offset: int):
+        #Дешифрование блока со смещения offset с записью в out по смещению out_offset
+        self._check_block(block, offset)
+        struct.pack_into('<4I', out, out_offset,
+                         *self._decrypt_words(*struct.unpack_from('<4I', block, offset)))
+    
+    def _get_np_tables(self, np):
+        #Ключевые таблицы и раундовые ключи в виде массивов uint32 (лениво)
+        if self._np_tables is None:
+            self._check_wiped()
+            self._np_tables = (
+                [np.array(t, dtype=np.uint32) for t in self._sbox],
+                np.array(self._round_keys, dtype=np.uint32)
+            )
+        return self._np_tables
+    
+    def encrypt_blocks(self, data: bytes) -> bytes:
+        """Шифрование N блоков за один проход (все раунды сразу для всех блоков)"""
+        out = bytearray(len(data))
+        self.encrypt_blocks_into(data, out)
+        return bytes(out)
+    
+    def decrypt_blocks(self, data: bytes) -> bytes:
+        """Дешифрование N блоков за один проход"""
+        out = bytearray(len(data))
+        self.decrypt_blocks_into(data, out)
+        return bytes(out)
+    
+    def encrypt_blocks_into(self, data, out, out_offset: int = 0):
+        #Пакетное шифрование буфера data с записью в буфер out
+        if len(data) % BLOCK_SIZE != 0:
+            raise ValueError(f"Длина данных должна быть кратна {BLOCK_SIZE} байтам")
+        # NumPy не нужен (и не импортируется) для небольших буферов
+        np = load_numpy() if self.USE_NUMPY and len(data) >= self.NP_MIN_BLOCKS * BLOCK_SIZE else None
+        if np is None:
+            for i in range(0, len(data), BLOCK_SIZE):
+                self.encrypt_block_into(data, i, out, out_offset + i)
+            return
+        if not len(data):
+            return
         
-        # Разбиваем блок на 4 32-битных слова
-        x = list(struct.unpack('<4I', block))
+        (s0, s1, s2, s3), k = self._get_np_tables(np)
+        x = np.frombuffer(data, dtype='<u4').reshape(-1, 4)
+        x0 = x[:, 0] ^ k[0]
+        x1 = x[:, 1] ^ k[1]
+        x2 = x[:, 2] ^ k[2]
+        x3 = x[:, 3] ^ k[3]
         
-        # Входное отбеливание (для дешифрования)
-        for i in range(4):
-            x[i] ^= self._round_keys[i + 4]
+        for r in range(8, 8 + 2 * ROUNDS, 2):
+            t0 = s0[x0 & 0xFF] ^ s1[(x0 >> 8) & 0xFF] ^ s2[(x0 >> 16) & 0xFF] ^ s3[x0 >> 24]
+            t1 = s0[x1 & 0xFF] ^ s1[(x1 >> 8) & 0xFF] ^ s2[(x1 >> 16) & 0xFF] ^ s3[x1 >> 24]
+            
+            # Сложение по модулю 2^32 обеспечивается переполнением uint32
+            x2 ^= t0 + t1 + k[r]
+            x2 = (x2 >> 1) | (x2 << 31)
+            
+            x3 = (x3 << 1) | (x3 >> 31)
+            x3 ^= t0 + (t1 << 1) + k[r + 1]
+            
+            x0, x1, x2, x3 = x2, x3, x0, x1
         
-        # Обратные 16 раундов
-        x[0], x[1], x[2], x[3] = x[2], x[3], x[0], x[1]
+        # Результат пишется прямо в буфер вызывающего кода
+        dst = np.frombuffer(out, dtype='<u4', count=x.size, offset=out_offset).reshape(-1, 4)
+        dst[:, 0] = x2 ^ k[4]
+        dst[:, 1] = x3 ^ k[5]
+        dst[:, 2] = x0 ^ k[6]
+        dst[:, 3] = x1 ^ k[7]
+    
+    def decrypt_blocks_into(self, data, out, out_offset: int = 0):
+        #Пакетное дешифрование буфера data с записью в буфер out
+        if len(data) % BLOCK_SIZE != 0:
+            raise ValueError(f"Длина данных должна быть кратна {BLOCK_SIZE} байтам")
+        np = load_numpy() if self.USE_NUMPY and len(data) >= self.NP_MIN_BLOCKS * BLOCK_SIZE else None
+        if np is None:
+            for i in range(0, len(data), BLOCK_SIZE):
+                self.decrypt_block_into(data, i, out, out_offset + i)
+            return
+        if not len(data):
+            return
+        
+        (s0, s1, s2, s3), k = self._get_np_tables(np)
+        y = np.frombuffer(data, dtype='<u4').reshape(-1, 4)
+        x0 = y[:, 2] ^ k[6]
+        x1 = y[:, 3] ^ k[7]
+        x2 = y[:, 0] ^ k[4]
+        x3 = y[:, 1] ^ k[5]
         
-        for r in range(ROUNDS - 1, -1, -1):
-            x[0], x[1], x[2], x[3] = x[2], x[3], x[0], x[1]
+        for r in range(6 + 2 * ROUNDS, 6, -2):
+            x0, x1, x2, x3 = x2, x3, x0, x1
             
-            t0 = self._h(x[0], self._s)
-            t1 = self._h(x[1], self._s)
+            t0 = s0[x0 & 0xFF] ^ s1[(x0 >> 8) & 0xFF] ^ s2[(x0 >> 16) & 0xFF] ^ s3[x0 >> 24]
+            t1 = s0[x1 & 0xFF] ^ s1[(x1 >> 8) & 0xFF] ^ s2[(x1 >> 16) & 0xFF] ^ s3[x1 >> 24]
             
-            x[3] ^= (t0 + 2*t1 + self._round_keys[2*r + 9]) & 0xFFFFFFFF
-            x[3] = ((x[3] << 1) | (x[3] >> 31)) & 0xFFFFFFFF
+            x3 ^= t0 + (t1 << 1) + k[r + 1]
+            x3 = (x3 >> 1) | (x3 << 31)
             
-            x[2] = (x[2] >> 1) | ((x[2] & 1) << 31)
-            x[2] ^= (t0 + t1 + self._round_keys[2*r + 8]) & 0xFFFFFFFF
-        
-        # Выходное отбеливание (для дешифрования)
-        x[0], x[1], x[2], x[3] = x[2], x[3], x[0], x[1]
-        for i in range(4):
-            x[i] ^= self._round_keys[i]
+            x2 = (x2 << 1) | (x2 >> 31)
+            x2 ^= t0 + t1 + k[r]
         
-        return struct.pack('<4I', *x)
\ No newline at end of file
+        dst = np.frombuffer(out, dtype='<u4', count=y.size, offset=out_offset).reshape(-1, 4)
+        dst[:, 0] = x0 ^ k[0]
+        dst[:, 1] = x1 ^ k[1]
+        dst[:, 2] = x2 ^ k[2]
+        dst[:, 3] = x3 ^ k[3]
\ No newline at end of file
@@ -4,13 +4,16 @@ import argparse
 from typing import Dict, Any, Optional
 
 from core.twofish import Twofish
+from core.key_cache import get_cipher
 from core.gf256 import GF256
 from modes.encryption_modes import (
-    ECB, CBC, PCBC, CFB, OFB, CTR, RandomDelta
+    ECB, CBC, PCBC, CFB, CFB8, CFB1, OFB, CTR, RandomDelta
 )
 from padding.padding_schemes import PaddingMode
 from utils.file_handler import FileHandler
 from utils.parallel_processor import ParallelProcessor
+from utils.instrumentation import metrics
+from utils.container import SegmentedContainer
 from config import BLOCK_SIZE
 
 
@@ -21,22 +24,28 @@ class TwofishCipher:
         'cbc': CBC,
         'pcbc': PCBC,
         'cfb': CFB,
+        'cfb8': CFB8,
+        'cfb1': CFB1,
         'ofb': OFB,
         'ctr': CTR,
         'randomdelta': RandomDelta
     }
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], cipher: Optional[Twofish] = None):
       
         self.config = config
         self.key = bytes.fromhex(config['key'])
         self.polynomial = config.get('polynomial', 0x11B)
         
-        print(f"Инициализация Twofish с ключом длиной {len(self.key)} байт")
-        print(f"Используемый полином: {hex(self.polynomial)}")
+        metrics.log(f"Инициализация Twofish с ключом длиной {len(self.key)} байт")
+        metrics.log(f"Используемый полином: {hex(self.polynomial)}")
         
-        # Создаем экземпляр шифра
-        self.cipher = Twofish(self.key, self.polynomial)
+        # Берем развернутое расписание ключа из общего кэша (или готовое,
+        # переданное пакетным обработчиком)
+        if cipher is None:
+            cipher = get_cipher(self.key, self.polynomial, config.get('cipher_backend', 'auto'))
+        self.cipher = cipher
+        metrics.log(f"Реализация Twofish: {type(self.cipher).__name__}")
         
         # Определяем режим шифрования
         mode_name = config['mode'].lower()
@@ -46,15 +55,34 @@ class TwofishCipher:
         mode_class = self.MODES[mode_name]
         padding_mode = PaddingMode(config['padding'].lower())
         
-        print(f"Режим шифрования: {mode_name}")
-        print(f"Режим набивки: {padding_mode.value}")
+        metrics.log(f"Режим шифрования: {mode_name}")
+        metrics.log(f"Режим набивки: {padding_mode.value}")
+        
+        # Создаем процессор для параллельной обработки
+        use_processes = config.get('backend', 'thread') == 'process'
+        self.processor = ParallelProcessor(max_workers=config.get('threads', 4),
+                                           use_processes=use_processes)
+        metrics.log(f"Количество потоков: {config.get('threads', 4)}")
+        if use_processes:
+            metrics.log("Параллельная обработка: пул процессов")
+        # Потоковые части с пулом процессов должны делиться на диапазоны для
+        # всех процессов, иначе каждая часть займет только один из них
+        self.chunk_size = (self.processor.stream_chunk_size() if use_processes
+                           else FileHandler.CHUNK_SIZE)
         
         # Создаем экземпляр режима
-        self.mode = mode_class(self.cipher, padding_mode)
+        self.mode = mode_class(self.cipher, padding_mode, processor=self.processor)
         
-        # Создаем процессор для параллельной обработки
-        self.processor = ParallelProcessor(max_workers=config.get('threads', 4))
-        print(f"Количество потоков: {config.get('threads', 4)}")
+        # Файловый ввод-вывод: потоковый (stream) или через отображение в память (mmap)
+        self.use_mmap = config.get('io', 'stream') == 'mmap'
+        metrics.log(f"Ввод-вывод: {'mmap' if self.use_mmap else 'stream'}")
+        
+        # Формат файла: raw (только шифртекст) или container (заголовок и сегменты)
+        self.container = None
+        if config.get('format', 'raw') == 'container':
+            self.container = SegmentedContainer(self.cipher, self.processor)
+            self.segment_size = config.get('segment_size', SegmentedContainer.DEFAULT_SEGMENT_SIZE)
+            metrics.log(f"Формат: контейнер, сегменты по {self.segment_size} байт")
     
     def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
         """Шифрование данных"""
@@ -65,36 +93,53 @@ class TwofishCipher:
         return self.mode.decrypt(data, iv)
     
     def encrypt_file(self, input_file: str, output_file: str, iv: Optional[bytes] = None):
-        """Шифрование файла"""
-        print(f"Чтение файла: {input_file}")
-        data = FileHandler.read_file(input_file)
-        print(f"Размер данных: {len(data)} байт")
-        
-        print("Шифрование...")
-        encrypted = self.encrypt(data, iv)
-        print(f"Размер зашифрованных данных: {len(encrypted)} байт")
-        
-        print(f"Запись в файл: {output_file}")
-        FileHandler.write_file(output_file, encrypted)
-        print(f"Файл зашифрован: {output_file}")
+        """Шифрование файла (потоково, с постоянным расходом памяти)"""
+        metrics.log(f"Чтение файла: {input_file}")
+        _, size = FileHandler.get_file_info(input_file)
+        metrics.log(f"Размер данных: {size} байт")
+        
+        metrics.log("Шифрование...")
+        if self.container is not None:
+            written = self.container.encrypt_file(
+                input_file, output_file, self.config['mode'],
+                PaddingMode(self.config['padding'].lower()), iv, self.segment_size)
+        elif self.use_mmap:
+            # Длина шифртекста однозначно определяется режимом и набивкой
+            written = FileHandler.transform_file_mapped(
+                input_file, output_file, self.mode.output_length(size),
+                lambda src, dst: self.mode.encrypt_into(src, dst, iv))
+        else:
+            written = FileHandler.transform_file(input_file, output_file, self.mode.encryptor(iv),
+                                                 self.chunk_size)
+        metrics.log(f"Размер зашифрованных данных: {written} байт")
+        
+        metrics.log(f"Файл зашифрован: {output_file}")
     
     def decrypt_file(self, input_file: str, output_file: str, iv: Optional[bytes] = None):
-        """Дешифрование файла"""
-        print(f"Чтение файла: {input_file}")
-        data = FileHandler.read_file(input_file)
-        print(f"Размер данных: {len(data)} байт")
-        
-        print("Дешифрование...")
-        decrypted = self.decrypt(data, iv)
-        print(f"Размер расшифрованных данных: {len(decrypted)} байт")
-        
-        print(f"Запись в файл: {output_file}")
-        FileHandler.write_file(output_file, decrypted)
-        print(f"Файл расшифрован: {output_file}")
+        """Дешифрование файла (потоково, с постоянным расходом памяти)"""
+        metrics.log(f"Чтение файла: {input_file}")
+        _, size = FileHandler.get_file_info(input_file)
+        metrics.log(f"Размер данных: {size} байт")
+        
+        metrics.log("Дешифрование...")
+        if self.container is not None:
+            # Режим, набивка и IV берутся из заголовка контейнера
+            written = self.container.decrypt_file(input_file, output_file)
+        elif self.use_mmap:
+            written = FileHandler.transform_file_mapped(
+                input_file, output_file, size // self.mode.EXPANSION,
+                lambda src, dst: self.mode.decrypt_into(src, dst, iv))
+        else:
+            written = FileHandler.transform_file(input_file, output_file, self.mode.decryptor(iv),
+                                                 self.chunk_size)
+        metrics.log(f"Размер расшифрованных данных: {written} байт")
+        
+        metrics.log(f"Файл расшифрован: {output_file}")
 
 
-def read_config_from_file(filename: str) -> Dict[str, Any]:
-    #Чтение конфигурации из текстового файла
+def read_config_from_file(filename: str, require_io: bool = True) -> Dict[str, Any]:
+    #Чтение конфигурации из текстового файла (require_io=False - без
+    #обязательных input/output, для пакетной обработки)
     config = {}
     
     try:
@@ -121,6 +166,16 @@ def read_config_from_file(filename: str) -> Dict[str, Any]:
                         config['iv'] = value
                     elif key == 'threads':
                         config['threads'] = int(value)
+                    elif key == 'backend':
+                        config['backend'] = value.lower()
+                    elif key == 'io':
+                        config['io'] = value.lower()
+                    elif key == 'cipher_backend':
+                        config['cipher_backend'] = value.lower()
+                    elif key == 'format':
+                        config['format'] = value.lower()
+                    elif key == 'segment_size':
+                        config['segment_size'] = int(value)
                     elif key == 'operation':
                         config['operation'] = value.lower()
                     elif key == 'input':
@@ -132,13 +187,15 @@ def read_config_from_file(filename: str) -> Dict[str, Any]:
         raise
     
     # Проверка обязательных параметров
-    required = ['key', 'mode', 'padding', 'operation', 'input']
+    required = ['key', 'mode', 'padding', 'operation']
+    if require_io:
+        required.append('input')
     missing = [req for req in required if req not in config]
     if missing:
         raise ValueError(f"Отсутствуют обязательные параметры: {', '.join(missing)}")
     
     # Значения по умолчанию
-    if 'output' not in config:
+    if 'output' not in config and 'input' in config:
         if config['operation'] == 'encrypt':
             config['output'] = config['input'] + '.enc'
         else:
@@ -164,13 +221,21 @@ def main():
     parser = argparse.ArgumentParser(description='Twofish шифрование файлов')
     parser.add_argument('config_file', nargs='?', default='input.txt',
                        help='Файл конфигурации (по умолчанию input.txt)')
+    parser.add_argument('--quiet', action='store_true',
+                       help='Не выводить диагностические сообщения')
+    parser.add_argument('--stats', action='store_true',
+                       help='Собрать и вывести статистику по стадиям обработки')
     
     args = parser.parse_args()
+    metrics.set_verbose(not args.quiet)
+    if args.stats:
+        metrics.enable()
     
     try:
         # Читаем конфигурацию из файла
         config = read_config_from_file(args.config_file)
-        print_config(config)
+        if not args.quiet:
+            print_config(config)
         
         # Создание шифра
         cipher = TwofishCipher(config)
@@ -180,7 +245,7 @@ def main():
         if 'iv' in config and config['iv']:
             try:
                 iv = bytes.fromhex(config['iv'])
-                required_modes = ['cbc', 'pcbc', 'cfb', 'ofb']
+                required_modes = ['cbc', 'pcbc', 'cfb', 'cfb8', 'cfb1', 'ofb']
                 if config['mode'].lower() in required_modes and len(iv) != BLOCK_SIZE:
                     print(f"Предупреждение: IV должен быть {BLOCK_SIZE} байт для режима {config['mode']}")
             except ValueError:
@@ -197,6 +262,9 @@ def main():
             return 1
         
         print("\nОперация успешно завершена!")
+        if args.stats:
+            print("\nСтатистика:")
+            print(metrics.report())
         return 0
         
     except FileNotFoundError as e:
@@ -1,29 +1,158 @@
 ﻿from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Any, Optional, Tuple
 from core.twofish import Twofish
 from padding.padding_schemes import Padding, PaddingMode
 from config import BLOCK_SIZE
+from utils.instrumentation import metrics
 
 
 class EncryptionMode(ABC):
 
-    def __init__(self, cipher: Twofish, padding_mode: PaddingMode):
+    # Режим дополняет данные до целого числа блоков
+    PADDED = True
+    # Во сколько раз шифртекст полных блоков длиннее открытого текста
+    EXPANSION = 1
+    # Размер окна открытого текста, обрабатываемого за один вызов
+    # (ограничивает временные буферы при работе с большими отображениями)
+    WINDOW_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, cipher: Twofish, padding_mode: PaddingMode, processor=None):
    
         self.cipher = cipher
         self.padding_mode = padding_mode
+        # ParallelProcessor с пулом процессов для режимов, допускающих
+        # независимую обработку диапазонов блоков
+        self.processor = processor
+    
+    @property
+    def unit_size(self) -> int:
+        #Размер единицы обработки открытого текста (блок или сегмент)
+        return BLOCK_SIZE
+    
+    def _use_processes(self, data_len: int) -> bool:
+        #Имеет ли смысл отдавать данные в пул процессов
+        return (self.processor is not None and self.processor.use_processes and
+                data_len >= self.processor.MIN_RANGE_BLOCKS * BLOCK_SIZE)
     
-    @abstractmethod
     def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+        out = bytearray(self.output_length(len(data)))
+        written = self.encrypt_into(data, out, iv)
+        return bytes(memoryview(out)[:written])
+    
+    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+        out = bytearray(len(data) // self.EXPANSION)
+        written = self.decrypt_into(data, out, iv)
+        return bytes(memoryview(out)[:written])
+    
+    def encrypt_into(self, data, out, iv: Optional[bytes] = None) -> int:
+        #Шифрование буфера data в буфер out (не меньше output_length),
+        #возвращает число записанных байт
+        state = self._initial_state(iv)
+        data = memoryview(data)
+        out = memoryview(out)
+        if not self.PADDED:
+            self._encrypt_windows(data, out, state)
+            return len(data)
+        
+        started = metrics.start()
+        full_len, tail = self._padded_tail(data)
+        metrics.stop('padding', started)
+        written = full_len * self.EXPANSION
+        state = self._encrypt_windows(data[:full_len], out, state)
+        self._encrypt_blocks(tail, out[written:], state)
+        return written + len(tail) * self.EXPANSION
+    
+    def decrypt_into(self, data, out, iv: Optional[bytes] = None) -> int:
+        #Дешифрование буфера data в буфер out (не меньше len(data)),
+        #возвращает длину открытого текста
+        state = self._initial_state(iv)
+        if self.PADDED and len(data) % (BLOCK_SIZE * self.EXPANSION) != 0:
+            raise ValueError("Длина зашифрованных данных должна быть кратна размеру блока")
+        out = memoryview(out)
+        self._decrypt_windows(memoryview(data), out, state)
+        
+        plain_len = len(data) // self.EXPANSION
+        if not self.PADDED:
+            return plain_len
+        started = metrics.start()
+        plain_len = self._unpadded_length(out[:plain_len])
+        metrics.stop('padding', started)
+        return plain_len
+    
+    def _window(self, data_len: int) -> int:
+        #Размер окна (кратный единице обработки); пулу процессов окно
+        #отдается через общую память, поэтому его размер ограничен
+        #несколькими диапазонами на процесс, а не всем файлом
+        window = self.WINDOW_SIZE
+        if self._use_processes(data_len):
+            window = self.processor.process_window()
+        return max(window - window % self.unit_size, self.unit_size)
+    
+    def _encrypt_windows(self, data, out, state):
+        started = metrics.start()
+        window = self._window(len(data))
+        for i in range(0, len(data), window):
+            state = self._encrypt_blocks(data[i:i+window], out[i*self.EXPANSION:], state)
+        if started:
+            metrics.stop('encrypt_blocks', started, len(data))
+            metrics.count('blocks_encrypted', (len(data) + BLOCK_SIZE - 1) // BLOCK_SIZE)
+        return state
+    
+    def _decrypt_windows(self, data, out, state):
+        started = metrics.start()
+        window = self._window(len(data)) * self.EXPANSION
+        for i in range(0, len(data), window):
+            state = self._decrypt_blocks(data[i:i+window], out[i//self.EXPANSION:], state)
+        if started:
+            metrics.stop('decrypt_blocks', started, len(data))
+            metrics.count('blocks_decrypted', (len(data) + BLOCK_SIZE - 1) // BLOCK_SIZE)
+        return state
+    
+    def encryptor(self, iv: Optional[bytes] = None):
+        """Потоковый контекст шифрования (update/finalize)"""
+        from .streaming import StreamEncryptor
+        return StreamEncryptor(self, iv)
+    
+    def decryptor(self, iv: Optional[bytes] = None):
+        """Потоковый контекст дешифрования (update/finalize)"""
+        from .streaming import StreamDecryptor
+        return StreamDecryptor(self, iv)
+    
+    def _initial_state(self, iv: Optional[bytes]) -> Any:
+        #Проверка IV и начальное состояние цепочки режима
+        return None
+    
+    @abstractmethod
+    def _encrypt_blocks(self, data, out, state) -> Any:
+        #Шифрование целых единиц обработки (последняя может быть неполной
+        #у режимов без набивки) с заданным состоянием цепочки;
+        #возвращает состояние для следующих данных
         pass
     
     @abstractmethod
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _decrypt_blocks(self, data, out, state) -> Any:
+        #Дешифрование целых единиц обработки, возвращает новое состояние
         pass
     
+    def output_length(self, data_len: int) -> int:
+        #Длина шифртекста для открытого текста длины data_len
+        if not self.PADDED:
+            return data_len
+        return (data_len - data_len % BLOCK_SIZE + BLOCK_SIZE) * self.EXPANSION
+    
     def _pad_data(self, data: bytes) -> bytes:
         #Добавление набивки к данным
         return Padding.pad(data, BLOCK_SIZE, self.padding_mode)
     
+    def _padded_tail(self, data) -> Tuple[int, bytes]:
+        #Длина полных блоков и последний блок с набивкой (без копирования данных)
+        full_len = len(data) - len(data) % BLOCK_SIZE
+        return full_len, Padding.pad(bytes(data[full_len:]), BLOCK_SIZE, self.padding_mode)
+    
     def _unpad_data(self, data: bytes) -> bytes:
         #Удаление набивки из данных
         return Padding.unpad(data, BLOCK_SIZE, self.padding_mode)
+    
+    def _unpadded_length(self, data) -> int:
+        #Длина данных без набивки
+        return Padding.unpadded_length(data, BLOCK_SIZE, self.padding_mode)
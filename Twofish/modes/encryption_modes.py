@@ -1,262 +1,429 @@
-﻿import struct
+﻿import os
+import secrets
+import struct
 from typing import Optional
 from .base_mode import EncryptionMode
 from config import BLOCK_SIZE
+from utils.instrumentation import metrics
+from utils.numpy_loader import load_numpy
+from utils.xor import xor_bytes, xor_into, xor_chain_blocks, NP_MIN_BYTES
 
 
 class ECB(EncryptionMode):
    
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
-        print(f"ECB encrypt: входные данные {len(data)} байт")
-        padded_data = self._pad_data(data)
-        print(f"После набивки: {len(padded_data)} байт")
-        
-        result = b''
-        for i in range(0, len(padded_data), BLOCK_SIZE):
-            block = padded_data[i:i+BLOCK_SIZE]
-            encrypted = self.cipher.encrypt_block(block)
-            result += encrypted
-        
-        print(f"Зашифровано: {len(result)} байт")
-        return result
+    def encrypt_into(self, data, out, iv: Optional[bytes] = None) -> int:
+        metrics.log(f"ECB encrypt: входные данные {len(data)} байт")
+        metrics.log(f"После набивки: {self.output_length(len(data))} байт")
+        written = super().encrypt_into(data, out, iv)
+        metrics.log(f"Зашифровано: {written} байт")
+        return written
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
-        print(f"ECB decrypt: входные данные {len(data)} байт")
-        if len(data) % BLOCK_SIZE != 0:
-            raise ValueError("Длина зашифрованных данных должна быть кратна размеру блока")
-        
-        result = b''
-        for i in range(0, len(data), BLOCK_SIZE):
-            block = data[i:i+BLOCK_SIZE]
-            decrypted = self.cipher.decrypt_block(block)
-            result += decrypted
-        
-        print(f"После дешифрования: {len(result)} байт")
-        unpadded = self._unpad_data(result)
-        print(f"После удаления набивки: {len(unpadded)} байт")
+    def decrypt_into(self, data, out, iv: Optional[bytes] = None) -> int:
+        metrics.log(f"ECB decrypt: входные данные {len(data)} байт")
+        unpadded = super().decrypt_into(data, out, iv)
+        metrics.log(f"После дешифрования: {len(data)} байт")
+        metrics.log(f"После удаления набивки: {unpadded} байт")
         return unpadded
+    
+    def _encrypt_blocks(self, data, out, state):
+        if self._use_processes(len(data)):
+            self.processor.process_ranges(self.cipher, 'encrypt', data, out)
+        else:
+            self.cipher.encrypt_blocks_into(data, out)
+        return state
+    
+    def _decrypt_blocks(self, data, out, state):
+        if self._use_processes(len(data)):
+            self.processor.process_ranges(self.cipher, 'decrypt', data, out)
+        else:
+            self.cipher.decrypt_blocks_into(data, out)
+        return state
 
 
 class CBC(EncryptionMode):
     
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _initial_state(self, iv: Optional[bytes]) -> bytes:
         if iv is None or len(iv) != BLOCK_SIZE:
             raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        
-        padded_data = self._pad_data(data)
-        result = b''
-        prev_block = iv
-        
-        for i in range(0, len(padded_data), BLOCK_SIZE):
-            block = padded_data[i:i+BLOCK_SIZE]
-            # XOR с предыдущим зашифрованным блоком (или IV)
-            xored = bytes(a ^ b for a, b in zip(block, prev_block))
-            encrypted = self.cipher.encrypt_block(xored)
-            result += encrypted
-            prev_block = encrypted
-        
-        return result
+        return bytes(iv)
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
-        if iv is None or len(iv) != BLOCK_SIZE:
-            raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        if len(data) % BLOCK_SIZE != 0:
-            raise ValueError("Длина зашифрованных данных должна быть кратна размеру блока")
-        
-        result = b''
-        prev_block = iv
-        
+    def _encrypt_blocks(self, data, out, prev_block):
         for i in range(0, len(data), BLOCK_SIZE):
-            block = data[i:i+BLOCK_SIZE]
-            decrypted = self.cipher.decrypt_block(block)
             # XOR с предыдущим зашифрованным блоком (или IV)
-            xored = bytes(a ^ b for a, b in zip(decrypted, prev_block))
-            result += xored
-            prev_block = block
-        
-        return self._unpad_data(result)
+            xored = xor_bytes(data[i:i+BLOCK_SIZE], prev_block)
+            self.cipher.encrypt_block_into(xored, 0, out, i)
+            prev_block = out[i:i+BLOCK_SIZE]
+        return bytes(prev_block)
+    
+    def _decrypt_blocks(self, data, out, prev_block):
+        n = len(data)
+        if not n:
+            return prev_block
+        # Все блоки шифртекста известны заранее - дешифруем их пакетом
+        # (или диапазонами в пуле процессов)
+        if self._use_processes(n):
+            self.processor.process_ranges(self.cipher, 'decrypt', data, out)
+        else:
+            self.cipher.decrypt_blocks_into(data, out)
+        # XOR с предыдущим зашифрованным блоком (или IV) за один проход
+        xor_into(out, prev_block)
+        xor_into(out[BLOCK_SIZE:n], data[:-BLOCK_SIZE])
+        return bytes(data[-BLOCK_SIZE:])
 
 
 class PCBC(EncryptionMode):
   
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _initial_state(self, iv: Optional[bytes]):
         if iv is None or len(iv) != BLOCK_SIZE:
             raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        
-        padded_data = self._pad_data(data)
-        result = b''
-        prev_plain = iv
-        prev_cipher = iv
-        
-        for i in range(0, len(padded_data), BLOCK_SIZE):
-            block = padded_data[i:i+BLOCK_SIZE]
-            # XOR с предыдущим открытым и зашифрованным блоком
-            xored = bytes(a ^ b ^ c for a, b, c in zip(block, prev_plain, prev_cipher))
-            encrypted = self.cipher.encrypt_block(xored)
-            result += encrypted
-            prev_plain = block
-            prev_cipher = encrypted
-        
-        return result
+        return bytes(iv), bytes(iv)
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
-        if iv is None or len(iv) != BLOCK_SIZE:
-            raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        if len(data) % BLOCK_SIZE != 0:
-            raise ValueError("Длина зашифрованных данных должна быть кратна размеру блока")
-        
-        result = b''
-        prev_plain = iv
-        prev_cipher = iv
+    def _encrypt_blocks(self, data, out, state):
+        prev_plain, prev_cipher = state
         
         for i in range(0, len(data), BLOCK_SIZE):
             block = data[i:i+BLOCK_SIZE]
-            decrypted = self.cipher.decrypt_block(block)
             # XOR с предыдущим открытым и зашифрованным блоком
-            xored = bytes(a ^ b ^ c for a, b, c in zip(decrypted, prev_plain, prev_cipher))
-            result += xored
-            prev_plain = xored
-            prev_cipher = block
+            xored = xor_bytes(block, xor_bytes(prev_plain, prev_cipher))
+            self.cipher.encrypt_block_into(xored, 0, out, i)
+            prev_plain = block
+            prev_cipher = out[i:i+BLOCK_SIZE]
         
-        return self._unpad_data(result)
+        return bytes(prev_plain), bytes(prev_cipher)
+    
+    def _decrypt_blocks(self, data, out, state):
+        prev_plain, prev_cipher = state
+        n = len(data)
+        if not n:
+            return state
+        # Дешифрование блоков не зависит от цепочки - выполняем его пакетом
+        self.cipher.decrypt_blocks_into(data, out)
+        
+        # P[i] = D(C[i]) ^ C[i-1] ^ P[i-1]: сначала XOR с предыдущими блоками
+        # шифртекста за один проход, затем накопительный XOR по открытому тексту
+        xor_into(out, prev_cipher)
+        xor_into(out[BLOCK_SIZE:n], data[:n - BLOCK_SIZE])
+        prev_plain = xor_chain_blocks(out[:n], BLOCK_SIZE, prev_plain)
+        
+        return prev_plain, bytes(data[n - BLOCK_SIZE:n])
 
 
 class CFB(EncryptionMode):
     
-    def __init__(self, cipher, padding_mode, segment_size=BLOCK_SIZE):
-        super().__init__(cipher, padding_mode)
+    # В CFB режиме набивка не требуется
+    PADDED = False
+    # Число сегментов, регистры которых шифруются одним пакетом при дешифровании
+    BATCH_SEGMENTS = 16384
+    
+    def __init__(self, cipher, padding_mode, segment_size=BLOCK_SIZE, processor=None):
+        super().__init__(cipher, padding_mode, processor)
+        if not 1 <= segment_size <= BLOCK_SIZE:
+            raise ValueError(f"Размер сегмента CFB должен быть от 1 до {BLOCK_SIZE} байт")
         self.segment_size = segment_size
     
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    @property
+    def unit_size(self) -> int:
+        return self.segment_size
+    
+    def _initial_state(self, iv: Optional[bytes]) -> bytes:
         if iv is None or len(iv) != BLOCK_SIZE:
             raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        
-        # В CFB режиме набивка не требуется
-        result = b''
-        register = iv
-        
-        for i in range(0, len(data), self.segment_size):
-            encrypted = self.cipher.encrypt_block(register)
-            segment = data[i:i+self.segment_size]
-            
+        return bytes(iv)
+    
+    def _encrypt_blocks(self, data, out, register):
+        # Регистр хранится целым числом (байты блока в порядке little-endian):
+        # сдвиг на сегмент - сдвиг вправо, новый сегмент дописывается в старшие байты
+        s = self.segment_size
+        shift = 8 * (BLOCK_SIZE - s)
+        reg = int.from_bytes(register, 'little')
+        encrypt_int = self.cipher.encrypt_int
+        n = len(data)
+        
+        if s == 1:
+            for i in range(n):
+                c = data[i] ^ (encrypt_int(reg) & 0xFF)
+                out[i] = c
+                reg = (reg >> 8) | (c << shift)
+            return reg.to_bytes(BLOCK_SIZE, 'little')
+        
+        mask = (1 << 8 * s) - 1
+        for i in range(0, n, s):
+            m = min(s, n - i)
             # XOR с зашифрованным регистром
-            xored = bytes(a ^ b for a, b in zip(segment, encrypted[:len(segment)]))
-            result += xored
-            
-            # Сдвигаем регистр
-            register = register[self.segment_size:] + xored
-        
-        return result
+            c = (int.from_bytes(data[i:i+m], 'little') ^ encrypt_int(reg)) & mask
+            out[i:i+m] = c.to_bytes(s, 'little')[:m]
+            reg = (reg >> 8 * s) | (c << shift)
+        return reg.to_bytes(BLOCK_SIZE, 'little')
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
-        if iv is None or len(iv) != BLOCK_SIZE:
-            raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        
-        result = b''
-        register = iv
-        
-        for i in range(0, len(data), self.segment_size):
-            encrypted = self.cipher.encrypt_block(register)
-            segment = data[i:i+self.segment_size]
-            
-            # Дешифрование в CFB - та же операция, что и шифрование
-            xored = bytes(a ^ b for a, b in zip(segment, encrypted[:len(segment)]))
-            result += xored
-            
-            # Сдвигаем регистр
-            register = register[self.segment_size:] + segment
-        
-        return result
+    def _decrypt_blocks(self, data, out, register):
+        n = len(data)
+        
+        if self.segment_size == BLOCK_SIZE:
+            # Регистр каждого полного сегмента - предыдущий блок шифртекста,
+            # поэтому гамма получается одним пакетным вызовом прямо в out
+            full_len = n - n % BLOCK_SIZE
+            first = self.cipher.encrypt_block(register)
+            if full_len:
+                out[:BLOCK_SIZE] = first
+                registers = data[:full_len - BLOCK_SIZE]
+                if self._use_processes(len(registers)):
+                    self.processor.process_ranges(self.cipher, 'encrypt', registers,
+                                                  out[BLOCK_SIZE:full_len])
+                else:
+                    self.cipher.encrypt_blocks_into(registers, out, BLOCK_SIZE)
+            if full_len < n:
+                # Гамма последнего неполного сегмента
+                last = self.cipher.encrypt_block(data, full_len - BLOCK_SIZE) if full_len else first
+                out[full_len:n] = last[:n - full_len]
+            # XOR гаммы с шифртекстом за один проход
+            xor_into(out, data)
+            return bytes(data[full_len - BLOCK_SIZE:full_len]) if full_len else register
+        
+        if not n:
+            return register
+        # Регистр сегмента i - 16 байт потока IV || шифртекст, начиная с i*s:
+        # все регистры известны заранее и шифруются пакетами
+        s = self.segment_size
+        stream = bytes(register) + bytes(data)
+        segments = (n + s - 1) // s
+        for first in range(0, segments, self.BATCH_SEGMENTS):
+            count = min(self.BATCH_SEGMENTS, segments - first)
+            base = first * s
+            registers = bytearray(count * BLOCK_SIZE)
+            for j in range(BLOCK_SIZE):
+                registers[j::BLOCK_SIZE] = stream[base + j:base + j + (count - 1) * s + 1:s]
+            encrypted = bytearray(count * BLOCK_SIZE)
+            self.cipher.encrypt_blocks_into(registers, encrypted)
+            # Гамма сегмента - первые s байт зашифрованного регистра
+            keystream = bytearray(count * s)
+            for j in range(s):
+                keystream[j::s] = encrypted[j::BLOCK_SIZE]
+            end = min(base + count * s, n)
+            out[base:end] = keystream[:end - base]
+        
+        xor_into(out, data)
+        return stream[-BLOCK_SIZE:]
+
+
+class CFB8(CFB):
+    """CFB с 8-битными сегментами (совместимость с устройствами, использующими CFB-8)"""
+    
+    def __init__(self, cipher, padding_mode, processor=None):
+        super().__init__(cipher, padding_mode, 1, processor)
+
+
+class CFB1(CFB):
+    """CFB с 1-битными сегментами (биты каждого байта - от старшего к младшему)"""
+    
+    # Маски для сдвига регистра на один бит: байт i регистра - биты 8i..8i+7 целого
+    _SHIFT_MASK = int.from_bytes(b'\xfe' * BLOCK_SIZE, 'little')
+    _CARRY_MASK = int.from_bytes(b'\x01' * (BLOCK_SIZE - 1), 'little')
+    
+    def __init__(self, cipher, padding_mode, processor=None):
+        super().__init__(cipher, padding_mode, 1, processor)
+    
+    def _encrypt_blocks(self, data, out, register):
+        return self._process_bits(data, out, register, True)
+    
+    def _decrypt_blocks(self, data, out, register):
+        return self._process_bits(data, out, register, False)
+    
+    def _process_bits(self, data, out, register, encrypt: bool):
+        # Регистр - целое число (байты в порядке little-endian), а поток бит идет
+        # от старшего бита байта 0: сдвиг на бит - сдвиг влево внутри каждого
+        # байта с переносом старшего бита следующего байта
+        reg = int.from_bytes(register, 'little')
+        encrypt_int = self.cipher.encrypt_int
+        shift_mask = self._SHIFT_MASK
+        carry_mask = self._CARRY_MASK
+        top = 8 * (BLOCK_SIZE - 1)
+        
+        for i in range(len(data)):
+            byte = data[i]
+            result = 0
+            for k in range(7, -1, -1):
+                bit = (byte >> k) & 1
+                # Гамма - старший бит первого байта зашифрованного регистра
+                out_bit = bit ^ ((encrypt_int(reg) >> 7) & 1)
+                result = (result << 1) | out_bit
+                feedback = out_bit if encrypt else bit
+                reg = ((reg << 1) & shift_mask) | ((reg >> 15) & carry_mask) | (feedback << top)
+            out[i] = result
+        return reg.to_bytes(BLOCK_SIZE, 'little')
 
 
 class OFB(EncryptionMode):
     
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    # В OFB режиме набивка не требуется
+    PADDED = False
+    
+    def _initial_state(self, iv: Optional[bytes]) -> bytes:
         if iv is None or len(iv) != BLOCK_SIZE:
             raise ValueError(f"IV должен быть {BLOCK_SIZE} байт")
-        
-        # В OFB режиме набивка не требуется
-        result = b''
-        register = iv
-        
-        for i in range(0, len(data), BLOCK_SIZE):
+        return bytes(iv)
+    
+    def _encrypt_blocks(self, data, out, register):
+        n = len(data)
+        for i in range(0, n, BLOCK_SIZE):
             register = self.cipher.encrypt_block(register)
-            block = data[i:i+BLOCK_SIZE]
-            
-            # XOR с зашифрованным регистром
-            xored = bytes(a ^ b for a, b in zip(block, register[:len(block)]))
-            result += xored
+            out[i:i+BLOCK_SIZE] = register[:n - i]
         
-        return result
+        # XOR гаммы с данными за один проход
+        xor_into(out, data)
+        return register
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _decrypt_blocks(self, data, out, register):
         # OFB симметричен
-        return self.encrypt(data, iv)
+        return self._encrypt_blocks(data, out, register)
 
 
 class CTR(EncryptionMode):
     
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    # В CTR режиме набивка не требуется
+    PADDED = False
+    
+    def _initial_state(self, iv: Optional[bytes]):
         if iv is None or len(iv) != BLOCK_SIZE // 2:
             raise ValueError(f"IV (nonce) должен быть {BLOCK_SIZE // 2} байт")
-        
-        # В CTR режиме набивка не требуется
-        result = b''
-        counter = 0
-        
-        for i in range(0, len(data), BLOCK_SIZE):
-            # Формируем блок счетчика: IV + счетчик
-            counter_bytes = struct.pack('>Q', counter)
-            input_block = iv + counter_bytes
-            encrypted = self.cipher.encrypt_block(input_block)
-            
-            block = data[i:i+BLOCK_SIZE]
-            # XOR с зашифрованным блоком счетчика
-            xored = bytes(a ^ b for a, b in zip(block, encrypted[:len(block)]))
-            result += xored
-            counter += 1
-        
-        return result
+        # Состояние - nonce и номер следующего блока счетчика
+        return bytes(iv), 0
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _encrypt_blocks(self, data, out, state):
+        nonce, counter = state
+        n = len(data)
+        blocks_count = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+        if self._use_processes(n):
+            self.processor.process_ranges(self.cipher, 'ctr', data, out,
+                                          nonce=nonce, counter=counter)
+            return nonce, counter + blocks_count
+        
+        full_len = n - n % BLOCK_SIZE
+        counters = self._counter_blocks(nonce, counter, blocks_count)
+        
+        # Гамма полных блоков пишется прямо в out, хвост - отдельно
+        self.cipher.encrypt_blocks_into(memoryview(counters)[:full_len], out)
+        if full_len < n:
+            out[full_len:n] = self.cipher.encrypt_block(counters, full_len)[:n - full_len]
+        
+        # XOR с зашифрованными блоками счетчика
+        xor_into(out, data)
+        return nonce, counter + blocks_count
+    
+    def _decrypt_blocks(self, data, out, state):
         # CTR симметричен
-        return self.encrypt(data, iv)
+        return self._encrypt_blocks(data, out, state)
+    
+    def decrypt_range(self, data, iv: bytes, offset: int, length: int) -> bytes:
+        """Дешифрование только байтов [offset, offset + length) шифртекста
+        
+        data - весь шифртекст: буфер (bytes, mmap, memoryview), открытый
+        двоичный файл или путь к файлу. Счетчик сразу устанавливается на
+        блок, содержащий offset, начало этого блока отбрасывается.
+        """
+        nonce, _ = self._initial_state(iv)
+        if offset < 0 or length < 0:
+            raise ValueError("Смещение и длина должны быть неотрицательными")
+        
+        if isinstance(data, (str, os.PathLike)):
+            from utils.file_handler import FileHandler
+            with FileHandler.open_mapped(data) as view:
+                return self.decrypt_range(view, iv, offset, length)
+        
+        first_block = offset // BLOCK_SIZE
+        start = first_block * BLOCK_SIZE
+        if hasattr(data, 'seek'):
+            # Файл: читаем только нужные блоки
+            data.seek(start)
+            segment = memoryview(data.read(offset + length - start))
+        else:
+            segment = memoryview(data)[start:offset + length]
+        if len(segment) <= offset - start:
+            return b''
+        
+        out = bytearray(len(segment))
+        self._encrypt_blocks(segment, memoryview(out), (nonce, first_block))
+        return bytes(memoryview(out)[offset - start:])
+    
+    @staticmethod
+    def _counter_blocks(iv: bytes, start: int, count: int) -> bytes:
+        #Блоки счетчика IV + счетчик (big-endian) для count блоков подряд
+        blocks = bytearray(count * BLOCK_SIZE)
+        half = BLOCK_SIZE // 2
+        counters = struct.pack(f'>{count}Q', *range(start, start + count))
+        for j in range(half):
+            blocks[j::BLOCK_SIZE] = bytes([iv[j]]) * count
+            blocks[half + j::BLOCK_SIZE] = counters[j::half]
+        return bytes(blocks)
 
 
 class RandomDelta(EncryptionMode):
     
-    def encrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    # Каждый блок сохраняется вместе со своим IV
+    EXPANSION = 2
+    
+    def _encrypt_blocks(self, data, out, state):
         # IV в этом режиме не используется напрямую
-        import secrets
-        
-        padded_data = self._pad_data(data)
-        result = b''
-        
-        for i in range(0, len(padded_data), BLOCK_SIZE):
-            block = padded_data[i:i+BLOCK_SIZE]
-            # Генерируем случайный IV для каждого блока
-            block_iv = secrets.token_bytes(BLOCK_SIZE)
-            # XOR с IV перед шифрованием
-            xored = bytes(a ^ b for a, b in zip(block, block_iv))
-            encrypted = self.cipher.encrypt_block(xored)
-            # Сохраняем IV вместе с зашифрованным блоком
-            result += block_iv + encrypted
-        
-        return result
+        n = len(data)
+        if not n:
+            return state
+        # Случайные IV всех блоков - одним чтением из CSPRNG
+        deltas = secrets.token_bytes(n)
+        # XOR с IV и пакетное шифрование (блоки независимы)
+        xored = xor_bytes(data, deltas)
+        encrypted = bytearray(n)
+        if self._use_processes(n):
+            self.processor.process_ranges(self.cipher, 'encrypt', xored, encrypted)
+        else:
+            self.cipher.encrypt_blocks_into(xored, encrypted)
+        # Сохраняем IV вместе с зашифрованным блоком
+        self._interleave(out, deltas, encrypted)
+        return state
     
-    def decrypt(self, data: bytes, iv: Optional[bytes] = None) -> bytes:
+    def _decrypt_blocks(self, data, out, state):
         if len(data) % (BLOCK_SIZE * 2) != 0:
             raise ValueError("Некорректная длина данных")
         
-        result = b''
-        
-        for i in range(0, len(data), BLOCK_SIZE * 2):
-            block_iv = data[i:i+BLOCK_SIZE]
-            encrypted = data[i+BLOCK_SIZE:i+BLOCK_SIZE*2]
-            
-            decrypted = self.cipher.decrypt_block(encrypted)
-            # XOR с сохраненным IV
-            xored = bytes(a ^ b for a, b in zip(decrypted, block_iv))
-            result += xored
-        
-        return self._unpad_data(result)
+        n = len(data) // 2
+        if not n:
+            return state
+        deltas, encrypted = self._deinterleave(data)
+        if self._use_processes(n):
+            self.processor.process_ranges(self.cipher, 'decrypt', encrypted, out)
+        else:
+            self.cipher.decrypt_blocks_into(encrypted, out)
+        # XOR с сохраненными IV
+        xor_into(out, deltas)
+        return state
+    
+    @staticmethod
+    def _interleave(out, deltas, encrypted):
+        #Запись пар (IV, блок): IV блока i в out[32i:32i+16], блок - следом
+        n = len(deltas)
+        # Без NumPy перестановка байтов выполняется срезами
+        np = load_numpy() if n >= NP_MIN_BYTES else None
+        if np is not None:
+            pairs = np.frombuffer(out, dtype=np.uint8, count=2 * n).reshape(-1, 2, BLOCK_SIZE)
+            pairs[:, 0] = np.frombuffer(deltas, dtype=np.uint8).reshape(-1, BLOCK_SIZE)
+            pairs[:, 1] = np.frombuffer(encrypted, dtype=np.uint8).reshape(-1, BLOCK_SIZE)
+            return
+        pair = 2 * BLOCK_SIZE
+        for j in range(BLOCK_SIZE):
+            out[j:2*n:pair] = deltas[j::BLOCK_SIZE]
+            out[BLOCK_SIZE + j:2*n:pair] = encrypted[j::BLOCK_SIZE]
+    
+    @staticmethod
+    def _deinterleave(data):
+        #Разделение пар (IV, блок) на непрерывные буферы IV и блоков
+        n = len(data) // 2
+        np = load_numpy() if n >= NP_MIN_BYTES else None
+        if np is not None:
+            pairs = np.frombuffer(data, dtype=np.uint8, count=2 * n).reshape(-1, 2, BLOCK_SIZE)
+            return pairs[:, 0].tobytes(), pairs[:, 1].tobytes()
+        pair = 2 * BLOCK_SIZE
+        deltas = bytearray(n)
+        encrypted = bytearray(n)
+        view = memoryview(data)
+        for j in range(BLOCK_SIZE):
+            deltas[j::BLOCK_SIZE] = view[j::pair]
+            encrypted[j::BLOCK_SIZE] = view[BLOCK_SIZE + j::pair]
+        return deltas, encrypted
@@ -0,0 +1,119 @@
+﻿"""Потоковые контексты шифрования с постоянным расходом памяти"""
+
+from typing import Optional
+from padding.padding_schemes import Padding, PaddingMode
+from config import BLOCK_SIZE
+from utils.instrumentation import metrics
+
+
+class _StreamContext:
+    
+    def __init__(self, mode, iv: Optional[bytes] = None):
+        
+        self.mode = mode
+        # Состояние цепочки режима: предыдущий блок CBC/PCBC, регистр
+        # CFB/OFB, счетчик CTR
+        self._state = mode._initial_state(iv)
+        self._buffer = bytearray()
+        self._finalized = False
+    
+    def _take(self, length: int) -> bytes:
+        #Извлечение length байт из начала буфера
+        data = bytes(self._buffer[:length])
+        del self._buffer[:length]
+        return data
+    
+    def _check_active(self):
+        if self._finalized:
+            raise ValueError("Контекст уже завершен вызовом finalize()")
+
+
+class StreamEncryptor(_StreamContext):
+    """Шифрование по частям: update(chunk) для данных, finalize() в конце"""
+    
+    def update(self, chunk) -> bytes:
+        self._check_active()
+        self._buffer += chunk
+        unit = self.mode.unit_size
+        ready = len(self._buffer) - len(self._buffer) % unit
+        if not ready:
+            return b''
+        
+        data = self._take(ready)
+        out = bytearray(ready * self.mode.EXPANSION)
+        self._state = self.mode._encrypt_windows(memoryview(data), memoryview(out), self._state)
+        return bytes(out)
+    
+    def finalize(self) -> bytes:
+        self._check_active()
+        self._finalized = True
+        # Набивка применяется только к последнему блоку
+        data = self._take(len(self._buffer))
+        if self.mode.PADDED:
+            started = metrics.start()
+            data = Padding.pad(data, BLOCK_SIZE, self.mode.padding_mode)
+            metrics.stop('padding', started)
+        out = bytearray(len(data) * self.mode.EXPANSION)
+        self.mode._encrypt_windows(memoryview(data), memoryview(out), self._state)
+        return bytes(out)
+
+
+class StreamDecryptor(_StreamContext):
+    """Дешифрование по частям: update(chunk) для данных, finalize() в конце"""
+    
+    def __init__(self, mode, iv: Optional[bytes] = None):
+        super().__init__(mode, iv)
+        self._zeros = mode.PADDED and mode.padding_mode == PaddingMode.ZEROS
+        # Для набивки нулями хвост из нулевых байт откладывается, пока не
+        # станет ясно, последний ли он; хранится только длина хвоста
+        self._pending_zeros = 0
+    
+    def update(self, chunk) -> bytes:
+        self._check_active()
+        self._buffer += chunk
+        unit = self.mode.unit_size * self.mode.EXPANSION
+        if self.mode.PADDED and not self._zeros:
+            # Последний полный блок удерживается до finalize() для снятия набивки
+            ready = (len(self._buffer) - 1) // unit * unit if self._buffer else 0
+        else:
+            ready = len(self._buffer) - len(self._buffer) % unit
+        if not ready:
+            return b''
+        
+        plain = self._decrypt(self._take(ready))
+        return self._emit(plain) if self._zeros else plain
+    
+    def finalize(self) -> bytes:
+        self._check_active()
+        self._finalized = True
+        data = self._take(len(self._buffer))
+        if self.mode.PADDED and len(data) % (BLOCK_SIZE * self.mode.EXPANSION) != 0:
+            raise ValueError("Длина зашифрованных данных должна быть кратна размеру блока")
+        
+        plain = self._decrypt(data)
+        if self._zeros:
+            # Оставшиеся отложенные нули - набивка
+            result = self._emit(plain)
+            self._pending_zeros = 0
+            return result
+        if self.mode.PADDED:
+            started = metrics.start()
+            plain_len = Padding.unpadded_length(plain, BLOCK_SIZE, self.mode.padding_mode)
+            metrics.stop('padding', started)
+            return plain[:plain_len]
+        return plain
+    
+    def _decrypt(self, data: bytes) -> bytes:
+        out = bytearray(len(data) // self.mode.EXPANSION)
+        self._state = self.mode._decrypt_windows(memoryview(data), memoryview(out), self._state)
+        return bytes(out)
+    
+    def _emit(self, plain: bytes) -> bytes:
+        #Выдача данных до последнего ненулевого байта, нули откладываются
+        end = len(plain.rstrip(b'\x00'))
+        if not end:
+            self._pending_zeros += len(plain)
+            return b''
+        result = bytes(self._pending_zeros) + plain[:end]
+        self._pending_zeros = len(plain) - end
+        return result
@@ -40,12 +40,25 @@ class Padding:
     @staticmethod
     def unpad(data: bytes, block_size: int, mode: PaddingMode) -> bytes:
         
+        return data[:Padding.unpadded_length(data, block_size, mode)]
+    
+    @staticmethod
+    def unpadded_length(data, block_size: int, mode: PaddingMode) -> int:
+        # Длина данных без набивки (без копирования буфера data)
+        
         if len(data) % block_size != 0:
             raise ValueError("Длина данных должна быть кратна размеру блока")
         
         if mode == PaddingMode.ZEROS:
-            # Удаляем нули в конце
-            return data.rstrip(b'\x00')
+            # Удаляем нули в конце (просматриваем буфер с конца поблочно)
+            end = len(data)
+            while end > 0:
+                start = end - block_size
+                tail = bytes(data[start:end]).rstrip(b'\x00')
+                if tail:
+                    return start + len(tail)
+                end = start
+            return 0
         
         elif mode == PaddingMode.ANSI_X923:
             pad_len = data[-1]
@@ -53,7 +66,7 @@ class Padding:
                 raise ValueError("Некорректная набивка ANSI X9.23")
             if not all(b == 0 for b in data[-pad_len:-1]):
                 raise ValueError("Некорректная набивка ANSI X9.23")
-            return data[:-pad_len]
+            return len(data) - pad_len if pad_len else 0
         
         elif mode == PaddingMode.PKCS7:
             pad_len = data[-1]
@@ -61,13 +74,13 @@ class Padding:
                 raise ValueError("Некорректная набивка PKCS7")
             if not all(b == pad_len for b in data[-pad_len:]):
                 raise ValueError("Некорректная набивка PKCS7")
-            return data[:-pad_len]
+            return len(data) - pad_len if pad_len else 0
         
         elif mode == PaddingMode.ISO_10126:
             pad_len = data[-1]
             if pad_len > block_size:
                 raise ValueError("Некорректная набивка ISO 10126")
-            return data[:-pad_len]
+            return len(data) - pad_len if pad_len else 0
         
         else:
             raise ValueError(f"Неподдерживаемый режим набивки: {mode}")
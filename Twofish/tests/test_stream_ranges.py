@@ -0,0 +1,78 @@
+﻿"""Потоковая обработка файла с пулом процессов
+
+Запуск из каталога Twofish: python -m unittest discover tests
+"""
+
+import os
+import tempfile
+import unittest
+
+from main import TwofishCipher
+from utils.instrumentation import metrics
+from utils.parallel_processor import ParallelProcessor
+
+
+CONFIG = {
+    'key': '00112233445566778899AABBCCDDEEFF',
+    'mode': 'ecb',
+    'padding': 'pkcs7',
+    'polynomial': 0x11B,
+    'threads': 2,
+    'backend': 'process',
+    'io': 'stream',
+    'format': 'raw',
+}
+
+
+class StreamRangesTest(unittest.TestCase):
+    
+    def setUp(self):
+        metrics.set_verbose(False)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input = os.path.join(self.tmp.name, 'input.bin')
+        with open(self.input, 'wb') as f:
+            f.write(os.urandom(3 * 1024 * 1024 + 5))
+    
+    def _path(self, name):
+        return os.path.join(self.tmp.name, name)
+    
+    def test_each_chunk_is_split_between_processes(self):
+        cipher = TwofishCipher(CONFIG)
+        self.addCleanup(cipher.processor.shutdown)
+        self.assertEqual(cipher.chunk_size, cipher.processor.stream_chunk_size())
+        
+        ranges = []
+        split_ranges = cipher.processor.split_ranges
+        
+        def record(n):
+            result = split_ranges(n)
+            ranges.append(len(result))
+            return result
+        
+        cipher.processor.split_ranges = record
+        cipher.encrypt_file(self.input, self._path('process.enc'))
+        cipher.decrypt_file(self._path('process.enc'), self._path('process.dec'))
+        
+        self.assertTrue(ranges)
+        self.assertTrue(all(count > 1 for count in ranges), ranges)
+        
+        reference = TwofishCipher(dict(CONFIG, backend='thread'))
+        self.addCleanup(reference.processor.shutdown)
+        reference.encrypt_file(self.input, self._path('thread.enc'))
+        with open(self._path('process.enc'), 'rb') as a, open(self._path('thread.enc'), 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+        with open(self.input, 'rb') as a, open(self._path('process.dec'), 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+    
+    def test_stream_chunk_covers_all_workers(self):
+        processor = ParallelProcessor(max_workers=4, use_processes=True)
+        self.addCleanup(processor.shutdown)
+        chunk = processor.stream_chunk_size()
+        self.assertEqual(len(processor.split_ranges(chunk)), 4)
+        # Дешифратор удерживает последний блок - части на блок короче
+        self.assertEqual(len(processor.split_ranges(chunk - 16)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
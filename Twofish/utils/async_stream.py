@@ -0,0 +1,96 @@
+﻿"""Асинхронное потоковое шифрование поверх asyncio.StreamReader/StreamWriter"""
+
+import asyncio
+import concurrent.futures
+from typing import AsyncIterable, AsyncIterator, Optional, Union
+
+
+class AsyncStreamProcessor:
+    """Пропускает поток байт через контекст update/finalize частями
+    
+    Чтение источника идет в отдельной задаче и ограничено очередью из
+    max_in_flight частей; шифрование выполняется вне цикла событий, а
+    запись ждет drain() - так медленный получатель притормаживает чтение.
+    """
+    
+    def __init__(self, context, chunk_size: int = 64 * 1024, max_in_flight: int = 4,
+                 executor: Optional[concurrent.futures.Executor] = None):
+        
+        if chunk_size <= 0 or max_in_flight <= 0:
+            raise ValueError("Размер части и число частей в обработке должны быть положительными")
+        
+        self.context = context
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.executor = executor
+    
+    async def _read_source(self, source, queue: asyncio.Queue):
+        #Чтение источника в очередь частями не больше chunk_size
+        try:
+            if isinstance(source, asyncio.StreamReader):
+                while True:
+                    chunk = await source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    await queue.put(chunk)
+            else:
+                async for data in source:
+                    view = memoryview(data)
+                    for i in range(0, len(view), self.chunk_size):
+                        await queue.put(bytes(view[i:i+self.chunk_size]))
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+    
+    async def iter_process(self, source: Union[asyncio.StreamReader, AsyncIterable[bytes]]
+                           ) -> AsyncIterator[bytes]:
+        """Обработанные части в исходном порядке (последняя - результат finalize)"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_in_flight)
+        reader = asyncio.ensure_future(self._read_source(source, queue))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                # Контекст хранит состояние цепочки, поэтому части
+                # обрабатываются строго по очереди
+                result = await loop.run_in_executor(self.executor, self.context.update, chunk)
+                if result:
+                    yield result
+            result = await loop.run_in_executor(self.executor, self.context.finalize)
+            if result:
+                yield result
+        finally:
+            reader.cancel()
+    
+    async def process(self, source: Union[asyncio.StreamReader, AsyncIterable[bytes]],
+                      writer: asyncio.StreamWriter, close: bool = False) -> int:
+        """Обработка источника с записью в writer, возвращает число записанных байт"""
+        written = 0
+        try:
+            async for result in self.iter_process(source):
+                writer.write(result)
+                written += len(result)
+                # Обратное давление: ждем, пока получатель заберет данные
+                await writer.drain()
+        finally:
+            if close:
+                writer.close()
+                await writer.wait_closed()
+        return written
+
+
+async def encrypt_stream(mode, source, writer: asyncio.StreamWriter,
+                         iv: Optional[bytes] = None, **options) -> int:
+    """Шифрование потока режимом mode с записью в writer"""
+    return await AsyncStreamProcessor(mode.encryptor(iv), **options).process(source, writer)
+
+
+async def decrypt_stream(mode, source, writer: asyncio.StreamWriter,
+                         iv: Optional[bytes] = None, **options) -> int:
+    """Дешифрование потока режимом mode с записью в writer"""
+    return await AsyncStreamProcessor(mode.decryptor(iv), **options).process(source, writer)
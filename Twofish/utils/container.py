@@ -0,0 +1,233 @@
+﻿"""Контейнер с заголовком и независимо сцепленными сегментами
+
+Формат (все числа big-endian):
+    заголовок  - сигнатура, версия, режим, набивка, полином, размер сегмента,
+                 базовый IV, длина открытого текста
+    сегменты   - IV сегмента, длина открытого текста сегмента, шифртекст
+    индекс     - смещения записей сегментов
+    концовка   - смещение индекса, число сегментов, сигнатура индекса
+
+Каждый сегмент шифруется режимом как отдельное сообщение со своим IV,
+поэтому сегменты CBC/PCBC обрабатываются параллельно, а любой сегмент
+можно прочитать без обработки остальных.
+"""
+
+import os
+import struct
+from typing import BinaryIO, List, NamedTuple, Optional
+from modes.encryption_modes import ECB, CBC, PCBC, CFB, CFB8, CFB1, OFB, CTR, RandomDelta
+from padding.padding_schemes import PaddingMode
+from config import BLOCK_SIZE
+from .instrumentation import metrics
+from .xor import xor_bytes
+
+
+# Порядок определяет коды режимов и набивок в заголовке - только дополнять
+_MODES = (ECB, CBC, PCBC, CFB, OFB, CTR, RandomDelta, CFB8, CFB1)
+_PADDINGS = (PaddingMode.ZEROS, PaddingMode.ANSI_X923, PaddingMode.PKCS7,
+             PaddingMode.ISO_10126)
+
+# Длина IV, если она отличается от размера блока
+_IV_LENGTHS = {ECB: 0, RandomDelta: 0, CTR: BLOCK_SIZE // 2}
+
+_HEADER = struct.Struct('>4sBBBHIB16sQ')
+_RECORD = struct.Struct('>16sI')
+_OFFSET = struct.Struct('>Q')
+_TRAILER = struct.Struct('>QI4s')
+
+
+class ContainerHeader(NamedTuple):
+    mode_class: type
+    padding_mode: PaddingMode
+    polynomial: int
+    segment_size: int
+    base_iv: bytes
+    plain_size: int
+
+
+# Обработка одного сегмента (функции уровня модуля - для пула процессов)
+
+def _encrypt_segment(cipher, mode_class, padding_mode, iv, data) -> bytes:
+    return mode_class(cipher, padding_mode).encrypt(data, iv)
+
+
+def _decrypt_segment(cipher, mode_class, padding_mode, iv, data, plain_len) -> bytes:
+    mode = mode_class(cipher, padding_mode)
+    out = bytearray(len(data) // mode.EXPANSION)
+    unpadded = mode.decrypt_into(data, out, iv)
+    # Длина из записи сегмента точнее набивки нулями (нули в конце данных
+    # при ней неотличимы от набивки)
+    if plain_len > len(out) or (unpadded != plain_len and padding_mode != PaddingMode.ZEROS):
+        raise ValueError("Длина сегмента не совпадает с расшифрованными данными")
+    return bytes(memoryview(out)[:plain_len])
+
+
+class SegmentedContainer:
+    
+    MAGIC = b'TFSC'
+    INDEX_MAGIC = b'TFSX'
+    VERSION = 1
+    DEFAULT_SEGMENT_SIZE = 1024 * 1024
+    
+    def __init__(self, cipher, processor=None):
+        
+        self.cipher = cipher
+        # ParallelProcessor: сегменты раздаются его потокам или процессам
+        self.processor = processor
+    
+    @staticmethod
+    def iv_length(mode_class) -> int:
+        return _IV_LENGTHS.get(mode_class, BLOCK_SIZE)
+    
+    def derive_iv(self, base_iv: bytes, index: int) -> Optional[bytes]:
+        #IV сегмента: E_K(базовый IV XOR номер сегмента), усеченный до длины IV режима
+        if not base_iv:
+            return None
+        block = base_iv.ljust(BLOCK_SIZE, b'\x00')
+        tweak = index.to_bytes(BLOCK_SIZE, 'big')
+        derived = self.cipher.encrypt_block(xor_bytes(block, tweak))
+        return derived[:len(base_iv)]
+    
+    def _batch_size(self) -> int:
+        #Число сегментов, одновременно находящихся в памяти
+        if self.processor is None:
+            return 1
+        return 2 * (self.processor.max_workers or os.cpu_count() or 1)
+    
+    def _map(self, func, args_list: List[tuple]) -> List[bytes]:
+        if self.processor is None or len(args_list) == 1:
+            return [func(self.cipher, *args) for args in args_list]
+        return self.processor.map_with_cipher(self.cipher, func, args_list)
+    
+    def encrypt_file(self, input_file: str, output_file: str, mode_name: str,
+                     padding_mode: PaddingMode, iv: Optional[bytes] = None,
+                     segment_size: int = DEFAULT_SEGMENT_SIZE) -> int:
+        """Шифрование файла в контейнер, возвращает размер контейнера"""
+        mode_class = self._mode_class(mode_name)
+        if not 0 < segment_size < 2 ** 32:
+            raise ValueError("Размер сегмента должен быть положительным и меньше 4 ГБ")
+        if segment_size % BLOCK_SIZE != 0:
+            raise ValueError(f"Размер сегмента должен быть кратен {BLOCK_SIZE} байтам")
+        
+        iv_len = self.iv_length(mode_class)
+        if iv_len and iv is None:
+            iv = os.urandom(iv_len)
+        elif iv_len and len(iv) != iv_len:
+            raise ValueError(f"IV должен быть {iv_len} байт")
+        base_iv = iv if iv_len else b''
+        
+        plain_size = os.path.getsize(input_file)
+        header = ContainerHeader(mode_class, padding_mode, self.cipher.gf.polynomial,
+                                 segment_size, base_iv, plain_size)
+        offsets = []
+        with open(input_file, 'rb') as fin, open(output_file, 'wb') as fout:
+            fout.write(self._pack_header(header))
+            index = 0
+            while True:
+                args_list = []
+                for _ in range(self._batch_size()):
+                    chunk = fin.read(segment_size)
+                    if not chunk:
+                        break
+                    args_list.append((mode_class, padding_mode,
+                                      self.derive_iv(base_iv, index + len(args_list)), chunk))
+                if not args_list:
+                    break
+                
+                for args, encrypted in zip(args_list, self._map(_encrypt_segment, args_list)):
+                    offsets.append(fout.tell())
+                    fout.write(_RECORD.pack(args[2] or b'', len(args[3])))
+                    fout.write(encrypted)
+                index += len(args_list)
+                metrics.count('container_segments', len(args_list))
+            
+            index_offset = fout.tell()
+            fout.write(b''.join(_OFFSET.pack(offset) for offset in offsets))
+            fout.write(_TRAILER.pack(index_offset, len(offsets), self.INDEX_MAGIC))
+            return fout.tell()
+    
+    def decrypt_file(self, input_file: str, output_file: str) -> int:
+        """Дешифрование контейнера, возвращает длину открытого текста"""
+        written = 0
+        with open(input_file, 'rb') as fin, open(output_file, 'wb') as fout:
+            header = self.read_header(fin)
+            offsets = self.read_index(fin)
+            batch = self._batch_size()
+            for start in range(0, len(offsets), batch):
+                args_list = [self._read_record(fin, header, offset)
+                             for offset in offsets[start:start+batch]]
+                for plain in self._map(_decrypt_segment, args_list):
+                    fout.write(plain)
+                    written += len(plain)
+                metrics.count('container_segments', len(args_list))
+        
+        if written != header.plain_size:
+            raise ValueError("Длина расшифрованных данных не совпадает с заголовком контейнера")
+        return written
+    
+    def read_segment(self, input_file: str, index: int) -> bytes:
+        """Расшифровка одного сегмента без обработки остальных"""
+        with open(input_file, 'rb') as fin:
+            header = self.read_header(fin)
+            offsets = self.read_index(fin)
+            if not 0 <= index < len(offsets):
+                raise IndexError(f"Сегмент {index} вне диапазона 0..{len(offsets) - 1}")
+            return _decrypt_segment(self.cipher, *self._read_record(fin, header, offsets[index]))
+    
+    def read_header(self, f: BinaryIO) -> ContainerHeader:
+        """Чтение и проверка заголовка контейнера"""
+        f.seek(0)
+        raw = f.read(_HEADER.size)
+        if len(raw) != _HEADER.size:
+            raise ValueError("Файл слишком короткий для контейнера")
+        (magic, version, mode_id, padding_id, polynomial, segment_size,
+         iv_len, base_iv, plain_size) = _HEADER.unpack(raw)
+        if magic != self.MAGIC:
+            raise ValueError("Файл не является контейнером Twofish")
+        if version != self.VERSION:
+            raise ValueError(f"Неподдерживаемая версия контейнера: {version}")
+        if mode_id >= len(_MODES) or padding_id >= len(_PADDINGS):
+            raise ValueError("Неизвестный режим или набивка в заголовке контейнера")
+        if polynomial != self.cipher.gf.polynomial:
+            raise ValueError(f"Контейнер создан с полиномом {hex(polynomial)}, "
+                             f"а шифр использует {hex(self.cipher.gf.polynomial)}")
+        return ContainerHeader(_MODES[mode_id], _PADDINGS[padding_id], polynomial,
+                               segment_size, base_iv[:iv_len], plain_size)
+    
+    def read_index(self, f: BinaryIO) -> List[int]:
+        """Смещения записей сегментов из индекса в конце файла"""
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size < _HEADER.size + _TRAILER.size:
+            raise ValueError("Контейнер поврежден: нет индекса сегментов")
+        f.seek(size - _TRAILER.size)
+        index_offset, count, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != self.INDEX_MAGIC or index_offset + count * _OFFSET.size + _TRAILER.size != size:
+            raise ValueError("Контейнер поврежден: некорректный индекс сегментов")
+        f.seek(index_offset)
+        raw = f.read(count * _OFFSET.size)
+        return [offset for (offset,) in _OFFSET.iter_unpack(raw)]
+    
+    def _read_record(self, f: BinaryIO, header: ContainerHeader, offset: int) -> tuple:
+        #Аргументы _decrypt_segment для записи сегмента по смещению offset
+        f.seek(offset)
+        iv, plain_len = _RECORD.unpack(f.read(_RECORD.size))
+        mode = header.mode_class(self.cipher, header.padding_mode)
+        data = f.read(mode.output_length(plain_len))
+        if len(data) != mode.output_length(plain_len):
+            raise ValueError("Контейнер поврежден: запись сегмента обрезана")
+        iv_len = len(header.base_iv)
+        return header.mode_class, header.padding_mode, iv[:iv_len] if iv_len else None, data, plain_len
+    
+    def _pack_header(self, header: ContainerHeader) -> bytes:
+        return _HEADER.pack(self.MAGIC, self.VERSION, _MODES.index(header.mode_class),
+                            _PADDINGS.index(header.padding_mode), header.polynomial,
+                            header.segment_size, len(header.base_iv), header.base_iv,
+                            header.plain_size)
+    
+    @staticmethod
+    def _mode_class(mode_name: str):
+        for mode_class in _MODES:
+            if mode_class.__name__.lower() == mode_name.lower():
+                return mode_class
+        raise ValueError(f"Неподдерживаемый режим: {mode_name}")
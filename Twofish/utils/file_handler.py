@@ -1,5 +1,9 @@
 ﻿import os
-from typing import BinaryIO, Tuple, Optional
+import mmap
+import traceback
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Tuple, Optional
+from .instrumentation import metrics
 
 
 class FileHandler:
@@ -35,6 +39,97 @@ class FileHandler:
             for chunk in chunks:
                 f.write(chunk)
     
+    @staticmethod
+    def transform_file(input_path: str, output_path: str, context,
+                       chunk_size: int = CHUNK_SIZE) -> int:
+        # Потоковая обработка файла контекстом с методами update/finalize;
+        # в памяти одновременно находится не больше одной части
+        written = 0
+        with open(input_path, 'rb') as fin, open(output_path, 'wb') as fout:
+            while True:
+                started = metrics.start()
+                chunk = fin.read(chunk_size)
+                metrics.stop('io_read', started, len(chunk))
+                if not chunk:
+                    break
+                result = context.update(chunk)
+                started = metrics.start()
+                fout.write(result)
+                metrics.stop('io_write', started, len(result))
+                written += len(result)
+            result = context.finalize()
+            started = metrics.start()
+            fout.write(result)
+            metrics.stop('io_write', started, len(result))
+            written += len(result)
+        return written
+    
+    @staticmethod
+    @contextmanager
+    def open_mapped(filepath: str):
+        # Файл, отображенный в память только для чтения (memoryview)
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # Пустой файл отобразить нельзя
+                yield memoryview(b'')
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                except BaseException as e:
+                    FileHandler._drop_views(e)
+                    raise
+                finally:
+                    view.release()
+    
+    @staticmethod
+    def _drop_views(error: BaseException):
+        # Срезы отображения, оставшиеся в кадрах трассировки, не дают закрыть
+        # mmap (BufferError скрыл бы исходную ошибку) - очищаем эти кадры
+        traceback.clear_frames(error.__traceback__)
+    
+    @staticmethod
+    @contextmanager
+    def create_mapped(filepath: str, size: int):
+        # Новый файл заранее заданного размера, отображенный в память для записи;
+        # при ошибке недописанный файл удаляется
+        created = False
+        try:
+            with open(filepath, 'w+b') as f:
+                created = True
+                f.truncate(size)
+                if size == 0:
+                    yield memoryview(bytearray())
+                    return
+                with mmap.mmap(f.fileno(), size) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        yield view
+                    except BaseException as e:
+                        FileHandler._drop_views(e)
+                        raise
+                    finally:
+                        view.release()
+                        mapped.flush()
+        except BaseException:
+            if created:
+                os.remove(filepath)
+            raise
+    
+    @staticmethod
+    def transform_file_mapped(input_path: str, output_path: str, output_size: int,
+                              process: Callable) -> int:
+        # Обработка через отображения: process(src, dst) читает и пишет
+        # напрямую через memoryview и возвращает число записанных байт;
+        # output_size - верхняя граница результата, лишнее отрезается
+        with FileHandler.open_mapped(input_path) as src:
+            with FileHandler.create_mapped(output_path, output_size) as dst:
+                written = process(src, dst)
+        if written != output_size:
+            os.truncate(output_path, written)
+        return written
+    
     @staticmethod
     def get_file_info(filepath: str) -> Tuple[str, int]:
         
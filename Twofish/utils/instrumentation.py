@@ -0,0 +1,108 @@
+﻿"""Необязательная инструментация: счетчики, гистограммы времени по стадиям, хуки"""
+
+import threading
+import time
+from typing import Callable, Dict, Any
+
+
+class Instrumentation:
+    """Сбор статистики по стадиям обработки
+    
+    Пока сбор выключен, start() возвращает 0 и stop() сразу выходит, поэтому
+    в местах вызова не выполняется ни замеров времени, ни блокировок.
+    Диагностические сообщения (log) печатаются только в подробном режиме.
+    """
+    
+    def __init__(self):
+        
+        self.enabled = False
+        self.verbose = False
+        self._hooks = []
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def enable(self):
+        self.enabled = True
+    
+    def disable(self):
+        self.enabled = False
+    
+    def set_verbose(self, verbose: bool = True):
+        self.verbose = verbose
+    
+    def reset(self):
+        #Сброс накопленной статистики
+        self.counters: Dict[str, int] = {}
+        self.stages: Dict[str, Dict[str, Any]] = {}
+    
+    def add_hook(self, hook: Callable[[str, float, int], None]):
+        #hook(стадия, длительность в секундах, число байт) после каждой стадии
+        self._hooks.append(hook)
+    
+    def remove_hook(self, hook: Callable[[str, float, int], None]):
+        self._hooks.remove(hook)
+    
+    def log(self, message: str):
+        if self.verbose:
+            print(message)
+    
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+    
+    def start(self) -> float:
+        #Начало замера стадии (0, если сбор выключен)
+        return time.perf_counter() if self.enabled else 0.0
+    
+    def stop(self, stage: str, started: float, nbytes: int = 0):
+        #Завершение замера, начатого start()
+        if started:
+            self.record(stage, time.perf_counter() - started, nbytes)
+    
+    def record(self, stage: str, elapsed: float, nbytes: int = 0):
+        # Гистограмма по степеням двойки: корзина b - от 2^(b-1) до 2^b мкс
+        bucket = int(elapsed * 1e6).bit_length()
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = {
+                    'calls': 0, 'seconds': 0.0, 'bytes': 0,
+                    'min': elapsed, 'max': elapsed, 'histogram': {}
+                }
+            stats['calls'] += 1
+            stats['seconds'] += elapsed
+            stats['bytes'] += nbytes
+            stats['min'] = min(stats['min'], elapsed)
+            stats['max'] = max(stats['max'], elapsed)
+            stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+        for hook in self._hooks:
+            hook(stage, elapsed, nbytes)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        #Копия накопленной статистики
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {name: dict(stats, histogram=dict(stats['histogram']))
+                           for name, stats in self.stages.items()}
+            }
+    
+    def report(self) -> str:
+        #Текстовая сводка по стадиям
+        lines = []
+        snapshot = self.snapshot()
+        for name, stats in sorted(snapshot['stages'].items()):
+            line = (f"{name:<20} вызовов {stats['calls']:>7}, "
+                    f"всего {stats['seconds'] * 1000:10.2f} мс, "
+                    f"макс {stats['max'] * 1000:9.3f} мс")
+            if stats['bytes'] and stats['seconds']:
+                line += f", {stats['bytes'] / stats['seconds'] / 1e6:8.2f} МБ/с"
+            lines.append(line)
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{name:<20} {value}")
+        return '\n'.join(lines)
+
+
+# Общий для процесса экземпляр
+metrics = Instrumentation()
@@ -0,0 +1,21 @@
+﻿"""Отложенный импорт необязательного NumPy
+
+NumPy загружается при первой пакетной операции, которой он нужен, а не при
+импорте модулей, поэтому запуск без больших данных его не ждет.
+"""
+
+_numpy = None
+_loaded = False
+
+
+def load_numpy():
+    """Модуль numpy или None, если он не установлен"""
+    global _numpy, _loaded
+    if not _loaded:
+        try:
+            import numpy
+        except ImportError:  # NumPy необязателен: вызывающий код работает без него
+            numpy = None
+        _numpy = numpy
+        _loaded = True
+    return _numpy
@@ -1,15 +1,256 @@
 ﻿import asyncio
 import concurrent.futures
-from typing import Callable, List, Any, Optional
+import os
+import time
+import traceback
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, Iterator, List, Any, Optional, Tuple
 from functools import partial
+from config import BLOCK_SIZE
+from .xor import xor_into
+
+
+# Расписание ключа в процессе-обработчике (передается один раз при старте пула)
+_worker_cipher = None
+
+
+def _init_worker(cipher):
+    global _worker_cipher
+    _worker_cipher = cipher
+
+
+def _process_range(shm_name: str, start: int, end: int, operation: str,
+                   nonce: Optional[bytes], counter: int):
+    #Обработка непрерывного диапазона блоков прямо в общей памяти
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buf = shm.buf[start:end]
+    try:
+        if operation == 'encrypt':
+            _worker_cipher.encrypt_blocks_into(buf, buf)
+        elif operation == 'decrypt':
+            _worker_cipher.decrypt_blocks_into(buf, buf)
+        elif operation == 'ctr':
+            from modes.encryption_modes import CTR
+            blocks_count = (end - start + BLOCK_SIZE - 1) // BLOCK_SIZE
+            counters = CTR._counter_blocks(nonce, counter + start // BLOCK_SIZE, blocks_count)
+            keystream = _worker_cipher.encrypt_blocks(counters)
+            # Гамма дополнена до целых блоков - берем ровно длину диапазона
+            xor_into(buf, memoryview(keystream)[:end - start])
+        else:
+            raise ValueError(f"Неизвестная операция: {operation}")
+    except BaseException as e:
+        # Массивы поверх buf в кадрах трассировки держат общую память
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        # Срез должен быть освобожден до закрытия, иначе close() вызовет
+        # BufferError и скроет исключение обработчика
+        buf.release()
+        shm.close()
+
+
+def _call_with_cipher(func: Callable, args: tuple):
+    #Вызов func с расписанием ключа, переданным процессу при старте пула
+    return func(_worker_cipher, *args)
+
+
+def _timed_call(func: Callable, item):
+    #Результат func(item) и время его вычисления в обработчике
+    started = time.perf_counter()
+    result = func(item)
+    return result, time.perf_counter() - started
+
+
+def _process_block_range(process_func: Callable[[bytes], bytes], block_size: int, data) -> bytes:
+    #Одна задача планировщика: подряд идущие блоки обрабатываются поблочно
+    return b''.join(process_func(data[i:i+block_size]) for i in range(0, len(data), block_size))
+
+
+class TaskSizer:
+    """Адаптивный размер задачи по измеренной стоимости обработки байта
+    
+    Размер подбирается так, чтобы задача выполнялась около target_time
+    секунд: мелкие задачи тонут в накладных расходах планирования, а
+    крупные ухудшают балансировку и увеличивают расход памяти.
+    """
+    
+    def __init__(self, target_time: float, min_size: int, max_size: int, initial_size: int):
+        
+        self.target_time = target_time
+        self.min_size = min_size
+        self.max_size = max_size
+        self.task_size = initial_size
+        # Среднее время обработки одного байта (экспоненциальное сглаживание)
+        self.cost_per_byte = None
+    
+    def record(self, nbytes: int, seconds: float):
+        if nbytes <= 0:
+            return
+        cost = seconds / nbytes
+        if self.cost_per_byte is None:
+            self.cost_per_byte = cost
+        else:
+            self.cost_per_byte = 0.75 * self.cost_per_byte + 0.25 * cost
+        if self.cost_per_byte > 0:
+            size = int(self.target_time / self.cost_per_byte)
+        else:
+            size = self.max_size
+        self.task_size = max(self.min_size, min(self.max_size, size))
+    
+    def next_size(self, granularity: int) -> int:
+        #Текущий размер задачи, кратный granularity (не меньше одной единицы)
+        return max(granularity, self.task_size - self.task_size % granularity)
 
 
 class ParallelProcessor:
    
-    def __init__(self, max_workers: Optional[int] = None):
+    # Минимальный размер диапазона, отдаваемого одному процессу
+    MIN_RANGE_BLOCKS = 4096
+    # Число минимальных диапазонов на процесс в одном окне process_ranges
+    # (окно целиком копируется в общую память - /dev/shm может быть мал)
+    WINDOW_RANGES = 16
+    
+    def __init__(self, max_workers: Optional[int] = None, use_processes: bool = False,
+                 target_task_time: float = 0.005, min_task_size: int = 4 * 1024,
+                 max_task_size: int = 4 * 1024 * 1024, initial_task_size: int = 64 * 1024,
+                 max_in_flight: Optional[int] = None, max_in_flight_bytes: int = 64 * 1024 * 1024):
+        """max_workers/use_processes - размер и вид пула; остальное - настройки
+        планировщика: желаемое время одной задачи, границы и начальный размер
+        задачи в байтах, ограничения окна задач в обработке (по числу задач,
+        по умолчанию 2 на обработчик, и по объему данных)"""
         
         self.max_workers = max_workers
+        self.use_processes = use_processes
+        # Пул потоков создается один раз и используется всеми вызовами
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._process_pool = None
+        self._pool_cipher = None
+        
+        self.sizer = TaskSizer(target_task_time, min_task_size, max_task_size, initial_task_size)
+        self.max_in_flight = max_in_flight or 2 * (max_workers or os.cpu_count() or 1)
+        self.max_in_flight_bytes = max_in_flight_bytes
+    
+    def _get_process_pool(self, cipher):
+        #Пул процессов, проинициализированный расписанием ключа cipher
+        if self._process_pool is None or self._pool_cipher is not cipher:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=True)
+            self._process_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(cipher,)
+            )
+            self._pool_cipher = cipher
+        return self._process_pool
+    
+    def process_window(self) -> int:
+        #Объем данных одного вызова process_ranges при обработке окнами
+        return self.WINDOW_RANGES * self.stream_chunk_size()
+    
+    def stream_chunk_size(self) -> int:
+        #Размер части потоковой обработки, при котором process_ranges дает
+        #диапазон каждому процессу (меньшие части заняли бы один процесс)
+        workers = self.max_workers or os.cpu_count() or 1
+        return workers * self.MIN_RANGE_BLOCKS * BLOCK_SIZE
+    
+    def split_ranges(self, n: int) -> List[Tuple[int, int]]:
+        #Деление n байт на диапазоны (начало, конец) по числу процессов,
+        #не короче MIN_RANGE_BLOCKS блоков
+        workers = self.max_workers or os.cpu_count() or 1
+        blocks_count = (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+        range_blocks = max(self.MIN_RANGE_BLOCKS, -(-blocks_count // workers))
+        range_len = range_blocks * BLOCK_SIZE
+        return [(start, min(start + range_len, n)) for start in range(0, n, range_len)]
+    
+    def process_ranges(self, cipher, operation: str, data, out,
+                       nonce: Optional[bytes] = None, counter: int = 0):
+        """Обработка буфера в пуле процессов крупными диапазонами блоков
+        
+        operation: 'encrypt'/'decrypt' (ECB, длина кратна блоку) или 'ctr'
+        (гамма с nonce и начальным счетчиком counter). Результат пишется в out.
+        """
+        n = len(data)
+        if not n:
+            return
+        
+        shm = shared_memory.SharedMemory(create=True, size=n)
+        try:
+            shm.buf[:n] = data
+            pool = self._get_process_pool(cipher)
+            futures = [
+                pool.submit(_process_range, shm.name, start, end, operation, nonce, counter)
+                for start, end in self.split_ranges(n)
+            ]
+            for future in futures:
+                future.result()
+            out[:n] = shm.buf[:n]
+        finally:
+            shm.close()
+            shm.unlink()
+    
+    def map_with_cipher(self, cipher, func: Callable, args_list) -> List[Any]:
+        """Вызов func(cipher, *args) для каждого набора аргументов
+        
+        В режиме процессов func должна быть функцией уровня модуля, а
+        аргументы - сериализуемыми; расписание ключа повторно не передается.
+        Результаты возвращаются в исходном порядке.
+        """
+        if self.use_processes:
+            pool = self._get_process_pool(cipher)
+            return list(pool.map(partial(_call_with_cipher, func), args_list))
+        return list(self.executor.map(lambda args: func(cipher, *args), args_list))
+    
+    def imap_ordered(self, func: Callable, items: Iterable, adaptive: bool = False) -> Iterator:
+        """Результаты func(item) в исходном порядке со скользящим окном
+        
+        Одновременно в обработке не больше max_in_flight задач и
+        max_in_flight_bytes байт входных данных; items читаются лениво.
+        При adaptive=True время задач учитывается при выборе их размера.
+        """
+        window = deque()
+        in_flight = 0
+        
+        def collect():
+            nonlocal in_flight
+            future, size = window.popleft()
+            in_flight -= size
+            result, seconds = future.result()
+            if adaptive:
+                self.sizer.record(size, seconds)
+            return result
+        
+        try:
+            for item in items:
+                size = len(item)
+                while window and (len(window) >= self.max_in_flight or
+                                  in_flight + size > self.max_in_flight_bytes):
+                    yield collect()
+                window.append((self.executor.submit(_timed_call, func, item), size))
+                in_flight += size
+            while window:
+                yield collect()
+        finally:
+            for future, _ in window:
+                future.cancel()
+    
+    def _block_ranges(self, data, block_size: int) -> Iterator:
+        #Нарезка данных на задачи текущего адаптивного размера; срезы того же
+        #типа, что и data (process_func, как и раньше, получает bytes)
+        position = 0
+        while position < len(data):
+            size = self.sizer.next_size(block_size)
+            yield data[position:position+size]
+            position += size
+    
+    def _read_ranges(self, input_file: str, granularity: int) -> Iterator[bytes]:
+        #Чтение файла частями текущего адаптивного размера
+        with open(input_file, 'rb') as f:
+            while True:
+                chunk = f.read(self.sizer.next_size(granularity))
+                if not chunk:
+                    break
+                yield chunk
     
     def process_blocks_parallel(self, 
                                data: bytes, 
@@ -19,77 +260,73 @@ class ParallelProcessor:
         
         if not use_threads:
             # Последовательная обработка
-            result = b''
-            for i in range(0, len(data), block_size):
-                block = data[i:i+block_size]
-                result += process_func(block)
-            return result
-        
-        # Подготовка блоков для параллельной обработки
-        blocks = []
-        positions = []
-        for i in range(0, len(data), block_size):
-            blocks.append(data[i:i+block_size])
-            positions.append(i)
+            return _process_block_range(process_func, block_size, data)
         
-        # Параллельная обработка
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            processed_blocks = list(executor.map(process_func, blocks))
-        
-        # Сборка результата с сохранением порядка
-        result = bytearray(len(data))
-        for pos, processed in zip(positions, processed_blocks):
-            result[pos:pos+len(processed)] = processed
-        
-        return bytes(result)
+        # Блоки группируются в задачи адаптивного размера, результаты
+        # собираются по порядку
+        task = partial(_process_block_range, process_func, block_size)
+        return b''.join(self.imap_ordered(task, self._block_ranges(data, block_size), adaptive=True))
     
     async def process_blocks_async(self,
                                   data: bytes,
                                   block_size: int,
                                   process_func: Callable[[bytes], bytes]) -> bytes:
        
-        loop = asyncio.get_event_loop()
-        
-        # Подготовка блоков
-        blocks = []
-        positions = []
-        for i in range(0, len(data), block_size):
-            blocks.append(data[i:i+block_size])
-            positions.append(i)
+        loop = asyncio.get_running_loop()
+        task = partial(_timed_call, partial(_process_block_range, process_func, block_size))
         
-        # Асинхронная обработка в потоках
-        tasks = []
-        for block in blocks:
-            task = loop.run_in_executor(self.executor, process_func, block)
-            tasks.append(task)
+        # Задачи текущего адаптивного размера в общем пуле потоков со
+        # скользящим окном, как в imap_ordered: срезы создаются по мере отправки
+        window = deque()
+        in_flight = 0
+        results = []
         
-        processed_blocks = await asyncio.gather(*tasks)
+        async def collect():
+            nonlocal in_flight
+            future, size = window.popleft()
+            in_flight -= size
+            result, seconds = await future
+            self.sizer.record(size, seconds)
+            results.append(result)
         
-        # Сборка результата
-        result = bytearray(len(data))
-        for pos, processed in zip(positions, processed_blocks):
-            result[pos:pos+len(processed)] = processed
-        
-        return bytes(result)
+        try:
+            for chunk in self._block_ranges(data, block_size):
+                size = len(chunk)
+                while window and (len(window) >= self.max_in_flight or
+                                  in_flight + size > self.max_in_flight_bytes):
+                    await collect()
+                window.append((loop.run_in_executor(self.executor, task, chunk), size))
+                in_flight += size
+            while window:
+                await collect()
+        finally:
+            for future, _ in window:
+                future.cancel()
+        return b''.join(results)
     
     def process_file_parallel(self,
                              input_file: str,
                              output_file: str,
                              process_func: Callable[[bytes], bytes],
-                             chunk_size: int = 64 * 1024) -> None:
+                             chunk_size: Optional[int] = None) -> None:
+        """chunk_size=None - размер частей подбирается адаптивно (кратен
+        BLOCK_SIZE), иначе файл читается частями фиксированного размера"""
        
         from .file_handler import FileHandler
         
-        chunks = []
-        for chunk in FileHandler.read_chunks(input_file, chunk_size):
-            chunks.append(chunk)
-        
-        # Параллельная обработка частей
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            processed_chunks = list(executor.map(process_func, chunks))
-        
-        # Запись результата
-        FileHandler.write_chunks(output_file, processed_chunks)
+        if chunk_size is None:
+            chunks = self._read_ranges(input_file, BLOCK_SIZE)
+        else:
+            chunks = FileHandler.read_chunks(input_file, chunk_size)
+        # Части читаются по мере освобождения окна и пишутся по порядку -
+        # в памяти не больше max_in_flight частей
+        FileHandler.write_chunks(output_file, self.imap_ordered(process_func, chunks, adaptive=True))
     
-    def __del__(self):
+    def shutdown(self):
         self.executor.shutdown(wait=False)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+    
+    def __del__(self):
+        self.shutdown()
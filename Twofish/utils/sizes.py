@@ -0,0 +1,11 @@
+﻿"""Разбор размеров с суффиксами единиц"""
+
+_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    #Размер вида 16, 64K, 100M
+    text = text.strip().upper()
+    if text and text[-1] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
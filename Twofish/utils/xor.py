@@ -0,0 +1,57 @@
+﻿"""XOR буферов произвольной длины за один проход"""
+
+from .numpy_loader import load_numpy
+
+
+# Размер, с которого XOR через NumPy быстрее, чем через длинные целые
+NP_MIN_BYTES = 512
+
+
+def xor_bytes(a, b) -> bytes:
+    """a XOR b; длина результата - len(a), буфер b не короче a"""
+    n = len(a)
+    if not n:
+        return b''
+    # Без NumPy XOR выполняется через длинные целые
+    np = load_numpy() if n >= NP_MIN_BYTES else None
+    if np is not None:
+        return np.bitwise_xor(np.frombuffer(a, dtype=np.uint8, count=n),
+                              np.frombuffer(b, dtype=np.uint8, count=n)).tobytes()
+    x = int.from_bytes(a, 'little') ^ int.from_bytes(b[:n], 'little')
+    return x.to_bytes(n, 'little')
+
+
+def xor_into(dst, src):
+    """XOR буфера src в начало изменяемого буфера dst (bytearray, memoryview)"""
+    n = len(src)
+    if not n:
+        return
+    np = load_numpy() if n >= NP_MIN_BYTES else None
+    if np is not None:
+        target = np.frombuffer(dst, dtype=np.uint8, count=n)
+        np.bitwise_xor(target, np.frombuffer(src, dtype=np.uint8, count=n), out=target)
+        return
+    x = int.from_bytes(dst[:n], 'little') ^ int.from_bytes(src, 'little')
+    dst[:n] = x.to_bytes(n, 'little')
+
+
+def xor_chain_blocks(buf, block_size: int, initial: bytes) -> bytes:
+    """Цепочка XOR по блокам на месте: блок i ^= итоговый блок i-1
+    
+    Нулевой блок XOR-ится с initial. Возвращает итоговый последний блок
+    (или initial для пустого буфера).
+    """
+    n = len(buf)
+    if not n:
+        return initial
+    np = load_numpy() if n >= NP_MIN_BYTES else None
+    if np is not None:
+        blocks = np.frombuffer(buf, dtype=np.uint8, count=n).reshape(-1, block_size)
+        blocks[0] ^= np.frombuffer(initial, dtype=np.uint8)
+        np.bitwise_xor.accumulate(blocks, axis=0, out=blocks)
+        return bytes(buf[n - block_size:n])
+    prev = int.from_bytes(initial, 'little')
+    for i in range(0, n, block_size):
+        prev ^= int.from_bytes(buf[i:i+block_size], 'little')
+        buf[i:i+block_size] = prev.to_bytes(block_size, 'little')
+    return prev.to_bytes(block_size, 'little')